@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Learned carrier resolution for parcel-tracker.
+Records which tracking backend (carrier API or universal tracker) actually
+answered for each number shape, e.g. "LP+14d -> cainiao 99%", so later
+lookups go straight to the backend that works instead of replaying the
+whole fallback chain.
+Uses only standard library (no external dependencies).
+"""
+
+import sys
+import sqlite3
+import threading
+from typing import Optional, Dict, Tuple
+
+from db import connection, transaction
+
+# A shape's best backend is trusted once it has this many successes...
+MIN_SAMPLES = 3
+# ...and at least this success ratio
+MIN_SUCCESS_RATIO = 0.8
+
+
+class BackendStats:
+    """
+    Success/failure counters per (number shape, backend), stored in a
+    `backend_stats` table. Counts are buffered in memory and written in
+    one upsert by flush(), so a check run costs a single write.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._counts: Optional[Dict[Tuple[str, str], list]] = None
+        self._pending: Dict[Tuple[str, str], list] = {}
+
+    def _load(self):
+        if self._counts is not None:
+            return
+        counts = {}
+        try:
+            with connection(self.db_path) as conn:
+                for shape, backend, successes, failures in conn.execute(
+                        'SELECT shape, backend, successes, failures FROM backend_stats'):
+                    counts[(shape, backend)] = [successes, failures]
+        except sqlite3.Error as e:
+            print(f"Backend stats error: {e}", file=sys.stderr)
+        self._counts = counts
+
+    def preferred(self, shape: str) -> Optional[str]:
+        """Backend that reliably served this number shape, if any."""
+        with self._lock:
+            self._load()
+            best, best_ok = None, 0
+            for (s, backend), (successes, failures) in self._counts.items():
+                if s != shape or successes < MIN_SAMPLES:
+                    continue
+                if successes / (successes + failures) >= MIN_SUCCESS_RATIO and successes > best_ok:
+                    best, best_ok = backend, successes
+            return best
+
+    def record(self, shape: str, backend: str, success: bool):
+        """Count one success or failure of `backend` for `shape`."""
+        key = (shape, backend)
+        with self._lock:
+            self._load()
+            for counts in (self._counts, self._pending):
+                entry = counts.setdefault(key, [0, 0])
+                entry[0 if success else 1] += 1
+
+    def flush(self):
+        """Write buffered counters to the database."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            with transaction(self.db_path) as conn:
+                conn.executemany('''
+                    INSERT INTO backend_stats (shape, backend, successes, failures) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(shape, backend) DO UPDATE SET
+                        successes = successes + excluded.successes,
+                        failures = failures + excluded.failures
+                ''', [(shape, backend, ok, ko) for (shape, backend), (ok, ko) in pending.items()])
+        except sqlite3.Error as e:
+            print(f"Backend stats error: {e}", file=sys.stderr)
+
+    def table(self) -> Dict[str, Dict[str, float]]:
+        """{shape: {backend: success ratio}} for display."""
+        with self._lock:
+            self._load()
+            table = {}
+            for (shape, backend), (successes, failures) in sorted(self._counts.items()):
+                total = successes + failures
+                table.setdefault(shape, {})[backend] = successes / total if total else 0.0
+            return table
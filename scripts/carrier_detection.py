@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Carrier detection engine for parcel-tracker.
+Tracking number patterns are compiled once at import and indexed by
+number length; each length bucket is a single alternation regex, so
+detecting a carrier is one dict lookup plus one regex match. Buckets
+with check-digit formats (S10, UPS 1Z, FedEx, USPS IMpb) also validate
+the check digit to rule out and rank carriers.
+Uses only standard library (no external dependencies).
+"""
+
+import re
+from typing import Optional, Dict, List, Iterable, Tuple
+
+from check_digits import VALIDATORS, s10_country
+
+# (carrier, pattern, min length, max length, check digit) - ORDER MATTERS:
+# among equally plausible matches the first pattern wins, so specific
+# carriers come before generic numeric ones. Check digit names refer to
+# check_digits.VALIDATORS.
+CARRIER_PATTERNS: List[Tuple[str, str, int, int, Optional[str]]] = [
+    # DPD - Test before generic numeric patterns
+    ("dpd", r"\d{14}", 14, 14, None),
+    ("dpd", r"\d{18}", 18, 18, None),
+    # GLS - Test before generic numeric patterns
+    ("gls", r"\d{11,12}", 11, 12, None),
+    ("gls", r"\d{20}", 20, 20, None),
+    # La Poste / Colissimo (France)
+    ("colissimo", r"\d{13}", 13, 13, None),  # 13 digits standard
+    ("colissimo", r"[A-Z]{2}\d{9}[A-Z]{2}", 13, 13, "s10"),  # International (CJ, EK, etc.)
+    ("colissimo", r"6P\d{9}", 11, 11, None),  # Colissimo pickups
+    # Chronopost
+    ("chronopost", r"\d{13}", 13, 13, None),
+    ("chronopost", r"XX\d{9}[A-Z]{2}", 13, 13, "s10"),
+    # UPS
+    ("ups", r"1Z[A-Z0-9]{16}", 18, 18, "ups"),
+    ("ups", r"\d{12}", 12, 12, None),
+    ("ups", r"T\d{10}", 11, 11, None),
+    # FedEx
+    ("fedex", r"\d{12}", 12, 12, "fedex12"),
+    ("fedex", r"\d{15}", 15, 15, "mod10"),
+    ("fedex", r"\d{20}", 20, 20, None),
+    ("fedex", r"\d{34}", 34, 34, None),
+    # DHL
+    ("dhl", r"\d{10}", 10, 10, None),
+    ("dhl", r"\d{11}", 11, 11, None),
+    ("dhl", r"JJD\d{15,25}", 18, 28, None),
+    ("dhl", r"\d{20,25}", 20, 25, None),
+    # USPS
+    ("usps", r"(?:94|93|92|95)\d{20}", 22, 22, "impb"),
+    ("usps", r"\d{20,22}", 20, 22, "mod10"),
+    ("usps", r"[A-Z]{2}\d{9}[A-Z]{2}", 13, 13, "s10"),
+    ("usps", r"EA\d{9}[A-Z]{2}", 13, 13, "s10"),
+    # Royal Mail
+    ("royalmail", r"[A-Z]{2}\d{9}GB", 13, 13, "s10"),
+    ("royalmail", r"\d{13}", 13, 13, None),
+    # Hermes/Evri (UK)
+    ("evri", r"\d{16}", 16, 16, None),
+    # Mondial Relay
+    ("mondialrelay", r"\d{8}", 8, 8, None),
+    # InPost
+    ("inpost", r"\d{24}", 24, 24, None),
+    # Amazon Logistics
+    ("amazon", r"TB[ACM]\d{12}", 15, 15, None),
+    # Cainiao / AliExpress (China)
+    ("cainiao", r"CN[A-Z]{2}\d{9,15}[A-Z]{2}", 15, 21, None),  # CNFR...HD format
+    ("cainiao", r"LP\d{14}", 16, 16, None),  # AliExpress standard
+    ("cainiao", r"\d{14}", 14, 14, None),  # Chinese domestic
+    # Yanwen (Chinese carrier)
+    ("yanwen", r"\d{12,14}", 12, 14, None),  # Standard Yanwen
+    ("yanwen", r"YT\d{16}", 18, 18, None),  # YT prefix
+    ("yanwen", r"UF\d{14}", 16, 16, None),  # UF prefix
+    # Sunyou (Chinese carrier)
+    ("sunyou", r"SY\d{10,14}", 12, 16, None),
+    ("sunyou", r"\d{11}Y", 12, 12, None),
+    # 4PX (Chinese logistics)
+    ("4px", r"\d{12,15}", 12, 15, None),
+    ("4px", r"LX\d{12}CN", 16, 16, None),
+    # Catch-all last: any other 11-15 alphanumeric number is assumed La Poste (includes 8L...)
+    ("colissimo", r"[A-Z0-9]{11,15}", 11, 15, None),
+]
+
+
+# S10 origin country -> carrier most likely to have the tracking data
+S10_COUNTRY_CARRIERS = {
+    "FR": "colissimo",
+    "GB": "royalmail",
+    "US": "usps",
+    "CN": "cainiao",
+}
+
+
+def _build_index(patterns: List[Tuple[str, str, int, int, Optional[str]]]):
+    """
+    Group patterns by the lengths they can match. Each bucket keeps one
+    combined alternation whose first matching branch is the first matching
+    pattern, the individually compiled patterns (for ranked candidates),
+    and an alternation of just the check-digit patterns (None if there are
+    none): numbers it does not match skip validation entirely.
+    """
+    buckets: Dict[int, List[Tuple[int, str, str, Optional[str]]]] = {}
+    for i, (carrier, pattern, min_len, max_len, check) in enumerate(patterns):
+        for length in range(min_len, max_len + 1):
+            buckets.setdefault(length, []).append((i, carrier, pattern, check))
+
+    index = {}
+    for length, entries in buckets.items():
+        combined = re.compile("|".join(f"(?P<p{i}>{pattern})" for i, _, pattern, _ in entries))
+        compiled = [(carrier, re.compile(pattern), check) for _, carrier, pattern, check in entries]
+        checked = [pattern for _, _, pattern, check in entries if check]
+        checked_combined = re.compile("|".join(checked)) if checked else None
+        index[length] = (combined, compiled, checked_combined)
+    return index
+
+
+_INDEX = _build_index(CARRIER_PATTERNS)
+
+
+def normalize_tracking_number(tracking_number: str) -> str:
+    """Uppercase and strip the spaces/dashes people paste in."""
+    return tracking_number.upper().replace(" ", "").replace("-", "")
+
+
+def _rank(tn: str, bucket) -> Tuple[List[str], bool, int]:
+    """
+    Ranked candidates for a normalized number, whether a strong check
+    digit confirmed the first one, and how many leading candidates passed
+    a check digit. Patterns whose check digit fails are dropped; carriers
+    confirmed by a strong check come first, then those whose weak check
+    passed, then plain pattern matches.
+    """
+    strong, weak, neutral = [], [], []
+    s10 = False
+    for carrier, regex, check in bucket[1]:
+        if not regex.fullmatch(tn):
+            continue
+        if check:
+            validator, is_strong = VALIDATORS[check]
+            if not validator(tn):
+                continue
+            if is_strong:
+                strong.append(carrier)
+                s10 = s10 or check == "s10"
+            else:
+                weak.append(carrier)
+            continue
+        neutral.append(carrier)
+
+    if s10:
+        preferred = S10_COUNTRY_CARRIERS.get(s10_country(tn))
+        if preferred:
+            strong.insert(0, preferred)
+    checked = list(dict.fromkeys(strong + weak))
+    ranked = list(dict.fromkeys(checked + neutral))
+    return ranked, bool(strong), len(checked)
+
+
+def detect_carriers(tracking_number: str) -> List[str]:
+    """
+    All plausible carriers, most likely first. Carriers whose check digit
+    fails are ruled out; a valid S10, UPS 1Z or USPS IMpb ranks first,
+    then a valid FedEx or mod 10 check digit.
+    """
+    tn = normalize_tracking_number(tracking_number)
+    bucket = _INDEX.get(len(tn))
+    if bucket is None:
+        return []
+    return _rank(tn, bucket)[0]
+
+
+def checked_carriers(tracking_number: str) -> List[str]:
+    """
+    The leading candidates of detect_carriers() whose check digit (strong
+    or weak) passed; [] when no format with a check digit matched.
+    """
+    tn = normalize_tracking_number(tracking_number)
+    bucket = _INDEX.get(len(tn))
+    if bucket is None or bucket[2] is None or not bucket[2].fullmatch(tn):
+        return []
+    ranked, _, checked = _rank(tn, bucket)
+    return ranked[:checked]
+
+
+def verified_carrier(tracking_number: str) -> Optional[str]:
+    """The top carrier if a strong check digit confirmed it, else None."""
+    tn = normalize_tracking_number(tracking_number)
+    bucket = _INDEX.get(len(tn))
+    if bucket is None or bucket[2] is None or not bucket[2].fullmatch(tn):
+        return None
+    ranked, confirmed, _ = _rank(tn, bucket)
+    return ranked[0] if confirmed else None
+
+
+def _detect_normalized(tn: str) -> Optional[str]:
+    bucket = _INDEX.get(len(tn))
+    if bucket is None:
+        return None
+    combined, _, checked = bucket
+    if checked is not None and checked.fullmatch(tn):
+        ranked = _rank(tn, bucket)[0]
+        return ranked[0] if ranked else None
+    match = combined.fullmatch(tn)
+    return CARRIER_PATTERNS[int(match.lastgroup[1:])][0] if match else None
+
+
+def detect_carrier(tracking_number: str, all_candidates: bool = False):
+    """
+    Detect carrier from tracking number pattern.
+    Returns carrier code or None if unknown. With all_candidates=True,
+    returns the ranked list of every plausible carrier instead.
+    """
+    if all_candidates:
+        return detect_carriers(tracking_number)
+    return _detect_normalized(normalize_tracking_number(tracking_number))
+
+
+def detect_many(tracking_numbers: Iterable[str]) -> List[Optional[str]]:
+    """Detect carriers for a bulk list (e.g. a CSV import), in input order."""
+    detect = _detect_normalized
+    return [detect(tn.upper().replace(" ", "").replace("-", "")) for tn in tracking_numbers]
+
+
+def number_shape(tracking_number: str) -> str:
+    """
+    Coarse format of a tracking number used to learn which backend serves it:
+    leading letters (max 2) + length/kind of the middle + trailing letters (max 2).
+    e.g. LP00000000000001 -> "LP+14d", CJ123456785FR -> "CJ+9d+FR", 12345678901 -> "+11d".
+    """
+    tn = normalize_tracking_number(tracking_number)
+    head = len(tn) - len(tn.lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    prefix = tn[:min(head, 2)]
+    rest = tn[len(prefix):]
+    tail = len(rest) - len(rest.rstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    suffix = rest[len(rest) - min(tail, 2):] if tail else ""
+    middle = rest[:len(rest) - len(suffix)]
+    kind = "d" if middle.isdigit() else "x"
+    return f"{prefix}+{len(middle)}{kind}" + (f"+{suffix}" if suffix else "")
@@ -1,77 +1,67 @@
 #!/usr/bin/env python3
 """
-Check parcels for updates and send notifications via OpenClaw channels.
-Called by cron job or manually.
+Check parcels for updates and send notifications via OpenClaw channels
+(or the sinks configured in notify.json, see sinks.py).
+Called by cron job or manually; daemon.py does the same continuously. New updates are queued in the notification
+outbox by the check, then the outbox is dispatched (see outbox.py): updates
+that could not be sent stay queued and are retried by the next run.
 """
 import sys
 import os
-import subprocess
+import argparse
 
 # Add scripts directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from parcel_tracker import check_updates, get_carrier_display_name
-
-def send_openclaw_message(message):
-    """Send notification via OpenClaw messaging channels."""
-    try:
-        result = subprocess.run(
-            ["openclaw", "message", "send", "--message", message],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        return result.returncode == 0
-    except Exception as e:
-        print(f"Failed to send notification: {e}", file=sys.stderr)
-        return False
+from parcel_tracker import check_updates, format_check_stats, DEFAULT_WORKERS, HTTP_POOL
+from outbox import dispatch, format_dispatch_stats, COALESCE_WINDOW, DISPATCH_WORKERS
+from daemon import RunLock, LockHeld
 
 def main():
-    """Check for updates and send OpenClaw notifications."""
-    updates = check_updates()
+    """Check for updates, queue them and dispatch the outbox."""
+    parser = argparse.ArgumentParser(description="Check parcels and notify via OpenClaw")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="number of parcels fetched in parallel (default: %(default)s)")
+    parser.add_argument("--window", type=int, default=COALESCE_WINDOW,
+                        help="seconds pending updates wait to be coalesced into one message (default: %(default)s)")
+    parser.add_argument("--send-workers", type=int, default=DISPATCH_WORKERS,
+                        help="number of messages sent in parallel (default: %(default)s)")
+    parser.add_argument("--flush", action="store_true",
+                        help="send everything pending now, ignoring the coalescing window")
+    args = parser.parse_args()
     
-    if not updates:
-        print("No updates to notify")
+    # Overlapping cron ticks (or a running daemon) would poll the same parcels twice
+    lock = RunLock()
+    try:
+        lock.acquire()
+    except LockHeld as e:
+        print(f"Skipping: {e}")
         return 0
+    try:
+        return run(args)
+    finally:
+        lock.release()
+
+def run(args):
+    """Check, then dispatch the outbox (with the check lock held)."""
+    stats = {}
+    updates = check_updates(workers=args.workers, stats=stats)
+    print(format_check_stats(stats))
+    print(HTTP_POOL.summary())
+    if not updates:
+        print("No new updates")
     
-    # Send one consolidated message if multiple updates
-    if len(updates) == 1:
-        u = updates[0]
-        carrier = get_carrier_display_name(u["carrier"]) if u["carrier"] else "Unknown"
-        alias_str = f" [{u['alias']}]" if u.get("alias") else ""
-        
-        message = f"📦 Parcel Update\n\n"
-        message += f"{u['tracking_number']}{alias_str}\n"
-        message += f"Carrier: {carrier}\n"
-        message += f"Status: {u['status']}\n"
-        if u['event'].get('description'):
-            message += f"Event: {u['event']['description']}\n"
-        if u['event'].get('location'):
-            message += f"Location: {u['event']['location']}\n"
-        if u['event'].get('date'):
-            message += f"Time: {u['event']['date']}"
-        
-        success = send_openclaw_message(message)
-    else:
-        # Multiple updates - send summary
-        message = f"📦 {len(updates)} Parcel Updates\n\n"
-        for u in updates:
-            carrier = get_carrier_display_name(u["carrier"]) if u["carrier"] else "Unknown"
-            alias_str = f" [{u['alias']}]" if u.get("alias") else ""
-            message += f"• {u['tracking_number']}{alias_str} ({carrier}): {u['status']}\n"
-        
-        success = send_openclaw_message(message)
+    # Also sends what earlier runs left queued (retries, coalescing window)
+    sent = dispatch(window=args.window, workers=args.send_workers, flush=args.flush)
+    print(format_dispatch_stats(sent))
     
-    if success:
-        print(f"Sent {len(updates)} notification(s) via OpenClaw")
-        return 0
-    else:
-        # Fallback to stdout if OpenClaw fails
-        print("OpenClaw messaging failed, printing to stdout:")
-        for u in updates:
-            carrier = get_carrier_display_name(u["carrier"]) if u["carrier"] else "Unknown"
+    if sent["undelivered"]:
+        # Fallback to stdout if a sink fails (the updates stay queued)
+        print("Sending failed, printing to stdout:")
+        for u in sent["undelivered"]:
             alias_str = f" [{u['alias']}]" if u.get("alias") else ""
-            print(f"📦 {u['tracking_number']}{alias_str} ({carrier}): {u['status']}")
+            print(f"📦 {u['tracking_number']}{alias_str} ({u['carrier_name']}): {u['status']}")
         return 1
+    return 0
 
 if __name__ == "__main__":
     sys.exit(main())
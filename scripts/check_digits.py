@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Check-digit algorithms for tracking numbers.
+Used by carrier detection to rule out carriers whose format matches but
+whose check digit does not, before any network call is made.
+Uses only standard library (no external dependencies).
+"""
+
+from typing import Optional
+
+S10_WEIGHTS = (8, 6, 4, 2, 3, 5, 9, 7)
+FEDEX12_WEIGHTS = (3, 1, 7)
+
+
+def s10_valid(tn: str) -> bool:
+    """UPU S10 (e.g. CJ123456785FR): mod 11 over the 8 serial digits."""
+    if len(tn) != 13 or not tn[2:11].isdigit():
+        return False
+    total = sum(int(d) * w for d, w in zip(tn[2:10], S10_WEIGHTS))
+    check = 11 - total % 11
+    if check == 10:
+        check = 0
+    elif check == 11:
+        check = 5
+    return check == int(tn[10])
+
+
+def s10_country(tn: str) -> Optional[str]:
+    """Origin country code of an S10 number (its last two letters)."""
+    return tn[-2:] if len(tn) == 13 and tn[-2:].isalpha() else None
+
+
+def ups_valid(tn: str) -> bool:
+    """UPS 1Z numbers: mod 10 over characters 3-17, letters mapped A=2, B=3..."""
+    if len(tn) != 18 or not tn.startswith("1Z") or not tn[-1].isdigit():
+        return False
+    total = 0
+    for i, ch in enumerate(tn[2:17]):
+        value = int(ch) if ch.isdigit() else (ord(ch) - ord("A") + 2) % 10
+        total += value * (2 if i % 2 else 1)
+    return (10 - total % 10) % 10 == int(tn[17])
+
+
+def fedex12_valid(tn: str) -> bool:
+    """FedEx Express 12-digit numbers: weights 3,1,7 then mod 11."""
+    if len(tn) != 12 or not tn.isdigit():
+        return False
+    total = sum(int(d) * FEDEX12_WEIGHTS[i % 3] for i, d in enumerate(tn[:11]))
+    return total % 11 % 10 == int(tn[11])
+
+
+def mod10_valid(tn: str) -> bool:
+    """GS1-style mod 10 (weights 3,1 from the right) used by USPS IMpb and FedEx Ground."""
+    if len(tn) < 2 or not tn.isdigit():
+        return False
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(tn[:-1])))
+    return (10 - total % 10) % 10 == int(tn[-1])
+
+
+# name -> (validator, strong). A failing check rules the pattern out; a
+# passing *strong* check (specific format + check digit) ranks its carrier
+# first; a passing weak one (plain digit runs, where it also holds by
+# chance) ranks it after those but before plain pattern matches.
+VALIDATORS = {
+    "s10": (s10_valid, True),
+    "ups": (ups_valid, True),
+    "impb": (mod10_valid, True),
+    "fedex12": (fedex12_valid, False),
+    "mod10": (mod10_valid, False),
+}
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Check-and-notify daemon for parcel-tracker.
+Runs the checks and the notification dispatch in one long-lived process
+instead of a cron job starting check_and_notify.py every tick, so the
+HTTP connection pool, response and validator caches, learned backends
+and pooled SQLite connection stay warm between runs. The loop sleeps
+until the next parcel is due (see scheduler.next_check), waking at least
+every dispatch interval to send queued notifications.
+
+A lock file (flock) keeps one checker running at a time: the daemon,
+the web app's embedded loop and check_and_notify.py skip a run while
+another holds it. SIGTERM / SIGINT stop after the current parcel,
+SIGHUP reloads notify.json (sinks and routing) without a restart.
+
+Usage:
+  daemon.py [--workers N] [--window SECONDS] [--dispatch-interval SECONDS] [--max-sleep SECONDS]
+
+Uses only standard library (no external dependencies).
+"""
+
+import argparse
+import fcntl
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from db import DB_PATH, connection
+from parcel_tracker import check_updates, format_check_stats, init_db, DEFAULT_WORKERS, HTTP_POOL
+from outbox import dispatch, format_dispatch_stats, COALESCE_WINDOW, DISPATCH_WORKERS
+from scheduler import db_now, DB_TIME_FORMAT
+from sinks import get_routing, reload_routing
+
+LOCK_PATH = os.path.join(os.path.dirname(DB_PATH), "check.lock")
+# Seconds between dispatches of the notification outbox (retries, coalescing window)
+DISPATCH_INTERVAL = int(os.environ.get("PARCEL_DISPATCH_INTERVAL", "60"))
+# Longest sleep, so parcels added meanwhile (due at once) wait at most this long
+MAX_SLEEP = int(os.environ.get("PARCEL_DAEMON_MAX_SLEEP", "300"))
+RETRY_FAILED_CHECK = 60
+
+# Held while a check runs in this process (daemon loop or a web app "Check now")
+CHECK_LOCK = threading.Lock()
+
+
+def log(message: str):
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+
+class LockHeld(RuntimeError):
+    """Another process holds the check lock."""
+
+
+class RunLock:
+    """
+    Exclusive, non-blocking flock on LOCK_PATH. The kernel drops it when
+    the process exits, so a crashed checker never leaves it stale.
+    """
+
+    def __init__(self, path: str = LOCK_PATH):
+        self.path = path
+        self._fd = None
+
+    def acquire(self):
+        """Take the lock or raise LockHeld (naming the holder's pid)."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            holder = os.read(fd, 32).decode(errors="replace").strip() or "unknown"
+            os.close(fd)
+            raise LockHeld(f"another checker is running (pid {holder}, lock {self.path})")
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+
+    def release(self):
+        if self._fd is not None:
+            os.ftruncate(self._fd, 0)
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def seconds_until_due() -> Optional[float]:
+    """Seconds until the next active parcel is due (0 if one is), None without any."""
+    with connection(DB_PATH) as conn:
+        row = conn.execute('''
+            SELECT COUNT(*), MAX(next_check_at IS NULL), MIN(next_check_at)
+            FROM parcels WHERE archived = 0
+        ''').fetchone()
+    active, unscheduled, next_at = row
+    if not active:
+        return None
+    if unscheduled:
+        return 0.0
+    due = datetime.strptime(next_at, DB_TIME_FORMAT)
+    return max((due - db_now()).total_seconds(), 0.0)
+
+
+class CheckLoop:
+    """
+    Checks due parcels and dispatches the outbox on an internal timer.
+    run() blocks until stop(); start() runs it on a daemon thread (as the
+    web app does). on_check(updates, stats) is called after every check.
+    """
+
+    def __init__(self, workers: Optional[int] = None, window: Optional[int] = None,
+                 send_workers: int = DISPATCH_WORKERS, dispatch_interval: int = DISPATCH_INTERVAL,
+                 max_sleep: int = MAX_SLEEP,
+                 on_check: Optional[Callable[[List[Dict], Dict], None]] = None):
+        self.workers = workers or DEFAULT_WORKERS
+        self.window = COALESCE_WINDOW if window is None else window
+        self.send_workers = send_workers
+        self.dispatch_interval = dispatch_interval
+        self.max_sleep = max_sleep
+        self.on_check = on_check
+        self.runs = 0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._reload = False
+        self._thread = None
+
+    def stop(self):
+        """Stop after the current parcel (or right away when idle)."""
+        self._stop.set()
+        self._wake.set()
+
+    def reload(self):
+        """Reload notify.json before the next look at the schedule (safe from a signal handler)."""
+        self._reload = True
+        self._wake.set()
+
+    def wake(self):
+        """Re-check what is due now, e.g. after parcels were added."""
+        self._wake.set()
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self.run, name="check-loop", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run(self):
+        log(f"Check loop started ({self.workers} worker(s), dispatch every {self.dispatch_interval}s)")
+        next_dispatch = 0.0
+        while not self._stop.is_set():
+            try:
+                next_dispatch, sleep = self._iterate(next_dispatch)
+            except Exception as e:
+                # e.g. the database locked or unreadable: retry later rather than lose the thread
+                log(f"Check loop error: {e}")
+                sleep = RETRY_FAILED_CHECK
+            if self._stop.is_set():
+                break
+            self._wake.wait(sleep)
+            self._wake.clear()
+        log("Check loop stopped")
+
+    def _iterate(self, next_dispatch: float):
+        """One look at the schedule; returns (next dispatch time, seconds to sleep)."""
+        if self._reload:
+            self._reload = False
+            _, error = reload_routing()
+            log(f"Reload failed, keeping the current routing: {error}" if error else "Reloaded notify.json")
+
+        due_in = seconds_until_due()
+        if due_in == 0:
+            self.check()
+            next_dispatch = 0.0
+            due_in = seconds_until_due()
+            if due_in == 0:
+                # Nothing was rescheduled (the check failed): do not spin
+                due_in = RETRY_FAILED_CHECK
+        if self._stop.is_set():
+            return next_dispatch, 0
+
+        if time.monotonic() >= next_dispatch:
+            self.dispatch()
+            next_dispatch = time.monotonic() + self.dispatch_interval
+
+        sleep = min(self.max_sleep, max(next_dispatch - time.monotonic(), 1.0))
+        if due_in is not None:
+            sleep = min(sleep, max(due_in, 1.0))
+        return next_dispatch, sleep
+
+    def check(self):
+        """One check of the due parcels (after a web app check running in this process)."""
+        with CHECK_LOCK:
+            stats = {}
+            try:
+                updates = check_updates(workers=self.workers, stats=stats, stop=self._stop)
+            except Exception as e:
+                log(f"Check failed: {e}")
+                return
+        self.runs += 1
+        log(format_check_stats(stats) + (" (stopped)" if stats.get("stopped") else ""))
+        if updates:
+            log(f"{len(updates)} new update(s) queued")
+        if self.on_check:
+            self.on_check(updates, stats)
+
+    def dispatch(self):
+        try:
+            stats = dispatch(window=self.window, workers=self.send_workers)
+        except Exception as e:
+            log(f"Dispatch failed: {e}")
+            return
+        if stats["messages"] or stats["retrying"] or stats["given_up"]:
+            log(format_dispatch_stats(stats))
+
+
+def main():
+    """Run the check loop until SIGTERM / SIGINT."""
+    parser = argparse.ArgumentParser(description="Check parcels and send notifications continuously")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="number of parcels fetched in parallel (default: %(default)s)")
+    parser.add_argument("--window", type=int, default=COALESCE_WINDOW,
+                        help="seconds pending updates wait to be coalesced into one message (default: %(default)s)")
+    parser.add_argument("--send-workers", type=int, default=DISPATCH_WORKERS,
+                        help="number of messages sent in parallel (default: %(default)s)")
+    parser.add_argument("--dispatch-interval", type=int, default=DISPATCH_INTERVAL,
+                        help="seconds between outbox dispatches (default: %(default)s)")
+    parser.add_argument("--max-sleep", type=int, default=MAX_SLEEP,
+                        help="longest sleep between looks at the schedule (default: %(default)s)")
+    args = parser.parse_args()
+
+    init_db()
+    try:
+        get_routing()
+    except (OSError, ValueError) as e:
+        print(f"Not starting: invalid notification config: {e}", file=sys.stderr)
+        return 1
+    lock = RunLock()
+    try:
+        lock.acquire()
+    except LockHeld as e:
+        print(f"Not starting: {e}", file=sys.stderr)
+        return 1
+
+    loop = CheckLoop(workers=args.workers, window=args.window, send_workers=args.send_workers,
+                     dispatch_interval=args.dispatch_interval, max_sleep=args.max_sleep)
+    # Handlers only set flags and events: the loop runs on its own thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: loop.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: loop.stop())
+    signal.signal(signal.SIGHUP, lambda signum, frame: loop.reload())
+    try:
+        thread = loop.start()
+        while thread.is_alive():
+            thread.join(1)
+    finally:
+        lock.release()
+        HTTP_POOL.close()
+    log(f"Stopped after {loop.runs} check(s); {HTTP_POOL.summary()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
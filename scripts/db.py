@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+SQLite store for parcel-tracker.
+Opens connections with WAL journaling and tuned pragmas, and upgrades the
+schema in place through numbered migrations tracked in PRAGMA user_version.
+connection() / transaction() hand out pooled connections, so the CLI,
+web app and notifier do not pay a connect per call.
+Uses only standard library (no external dependencies).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# Database path
+DB_PATH = os.path.expanduser("~/.openclaw/workspace/parcel-tracker/data/parcels.db")
+
+# Seconds a connection waits for a lock held by another process (cron vs web app)
+BUSY_TIMEOUT = 30
+
+# Applied to every connection; journal_mode=WAL is persistent, the others are per connection
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",   # safe with WAL, one fsync per checkpoint instead of per commit
+    "PRAGMA cache_size = -8000",     # 8 MB page cache
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Prepared statements kept per connection (sqlite3's LRU statement cache)
+STATEMENT_CACHE_SIZE = 256
+
+
+def hash_key(key: str) -> str:
+    """Fixed-size digest stored instead of a free-text dedup key."""
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def event_hash(event: Dict) -> str:
+    """Identity of a carrier event: the same scan fetched twice hashes the same."""
+    parts = (event.get("date"), event.get("status"), event.get("location"), event.get("description"))
+    return hash_key("\x1f".join(str(p or "") for p in parts))
+
+
+def _add_columns(conn: sqlite3.Connection, table: str, columns: Tuple[Tuple[str, str], ...]):
+    """Add missing columns (older builds added some of them without a version bump)."""
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    for column, definition in columns:
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def _v1_base_schema(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS parcels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tracking_number TEXT UNIQUE NOT NULL,
+            alias TEXT,
+            carrier TEXT,
+            carrier_detected TEXT,
+            status TEXT,
+            last_event TEXT,
+            last_update TEXT,
+            destination TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            notified_events TEXT DEFAULT '[]'
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            parcel_id INTEGER,
+            timestamp TEXT,
+            status TEXT,
+            location TEXT,
+            description TEXT,
+            FOREIGN KEY (parcel_id) REFERENCES parcels(id)
+        )
+    ''')
+
+
+def _v2_scheduling(conn: sqlite3.Connection):
+    _add_columns(conn, "parcels", (
+        ("state", "TEXT DEFAULT 'pending'"),
+        ("next_check_at", "TEXT"),
+        ("last_checked_at", "TEXT"),
+        ("archived", "INTEGER DEFAULT 0"),
+    ))
+
+
+def _v3_resolved_backend(conn: sqlite3.Connection):
+    _add_columns(conn, "parcels", (("resolved_backend", "TEXT"),))
+
+
+def _v4_indexes(conn: sqlite3.Connection):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_parcel_time ON events (parcel_id, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_parcels_due ON parcels (archived, next_check_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_parcels_state ON parcels (state)')
+
+
+def _v5_notified_keys(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS notified_keys (
+            parcel_id INTEGER NOT NULL,
+            event_hash TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (parcel_id, event_hash)
+        )
+    ''')
+    # Move the JSON lists out of parcels.notified_events
+    rows = conn.execute("SELECT id, notified_events FROM parcels WHERE notified_events NOT IN ('', '[]')").fetchall()
+    for parcel_id, notified_json in rows:
+        try:
+            keys = json.loads(notified_json)
+        except ValueError:
+            continue
+        conn.executemany('INSERT OR IGNORE INTO notified_keys (parcel_id, event_hash) VALUES (?, ?)',
+                         [(parcel_id, hash_key(key)) for key in keys if isinstance(key, str)])
+    conn.execute("UPDATE parcels SET notified_events = '[]' WHERE notified_events NOT IN ('', '[]')")
+
+
+def _v6_event_hashes(conn: sqlite3.Connection):
+    _add_columns(conn, "events", (("event_hash", "TEXT"),))
+    rows = conn.execute('''
+        SELECT id, parcel_id, timestamp, status, location, description FROM events ORDER BY id
+    ''').fetchall()
+    seen, updates, duplicates = set(), [], []
+    for row_id, parcel_id, timestamp, status, location, description in rows:
+        key = (parcel_id, event_hash({"date": timestamp, "status": status,
+                                      "location": location, "description": description}))
+        if key in seen:
+            duplicates.append((row_id,))
+        else:
+            seen.add(key)
+            updates.append((key[1], row_id))
+    conn.executemany('UPDATE events SET event_hash = ? WHERE id = ?', updates)
+    conn.executemany('DELETE FROM events WHERE id = ?', duplicates)
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_events_hash ON events (parcel_id, event_hash)')
+
+
+def _v7_carrier_index(conn: sqlite3.Connection):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_parcels_carrier ON parcels (carrier_detected)')
+
+
+def _v8_status_changes(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS status_changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            parcel_id INTEGER NOT NULL,
+            tracking_number TEXT NOT NULL,
+            status TEXT,
+            state TEXT,
+            last_event TEXT,
+            last_update TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _v9_revision(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_revision (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            revision INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO data_revision (id, revision) VALUES (1, 0)')
+    # Only changes that show up in pages bump it (not scheduling columns)
+    bump = 'BEGIN UPDATE data_revision SET revision = revision + 1 WHERE id = 1; END'
+    for name, event in (
+        ("parcels_insert", "INSERT ON parcels"),
+        ("parcels_delete", "DELETE ON parcels"),
+        ("parcels_update", "UPDATE OF tracking_number, alias, carrier_detected, status, last_event, "
+                           "last_update, state, archived ON parcels"),
+        ("events_insert", "INSERT ON events"),
+        ("events_delete", "DELETE ON events"),
+    ):
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS revision_{name} AFTER {event} {bump}')
+
+
+def _v10_outbox(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            parcel_id INTEGER NOT NULL,
+            event_hash TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TEXT,
+            last_error TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            sent_at TEXT,
+            UNIQUE (parcel_id, event_hash, recipient)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (state, next_attempt_at)')
+
+
+def _v11_revision_guard(conn: sqlite3.Connection):
+    # The scheduler rewrites state/archived of every checked parcel: bump
+    # the revision only when a displayed column actually changed
+    columns = ("tracking_number", "alias", "carrier_detected", "status", "last_event",
+               "last_update", "state", "archived")
+    changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in columns)
+    conn.execute('DROP TRIGGER IF EXISTS revision_parcels_update')
+    conn.execute(f'''
+        CREATE TRIGGER revision_parcels_update AFTER UPDATE OF {", ".join(columns)} ON parcels
+        WHEN {changed}
+        BEGIN UPDATE data_revision SET revision = revision + 1 WHERE id = 1; END
+    ''')
+
+
+def _v12_helper_tables(conn: sqlite3.Connection):
+    # Formerly created on first use by rate_limiter, response_cache and backend_stats
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            key TEXT PRIMARY KEY,
+            tokens REAL,
+            updated_at REAL,
+            blocked_until REAL DEFAULT 0,
+            failures INTEGER DEFAULT 0,
+            quota_day TEXT,
+            quota_used INTEGER DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS response_cache (
+            tracking_number TEXT PRIMARY KEY,
+            carrier TEXT,
+            result TEXT,
+            fetched_at REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS backend_stats (
+            shape TEXT NOT NULL,
+            backend TEXT NOT NULL,
+            successes INTEGER DEFAULT 0,
+            failures INTEGER DEFAULT 0,
+            PRIMARY KEY (shape, backend)
+        )
+    ''')
+
+
+def _v13_schedule_revision(conn: sqlite3.Connection):
+    # The JSON API also returns the scheduling columns the revision ignores
+    _add_columns(conn, "data_revision", (("schedule_revision", "INTEGER NOT NULL DEFAULT 0"),))
+    columns = ("next_check_at", "destination")
+    changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in columns)
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS revision_parcels_schedule AFTER UPDATE OF {", ".join(columns)} ON parcels
+        WHEN {changed}
+        BEGIN UPDATE data_revision SET schedule_revision = schedule_revision + 1 WHERE id = 1; END
+    ''')
+
+
+def data_revision(conn: sqlite3.Connection, schedule: bool = False) -> int:
+    """
+    Counter bumped by triggers whenever displayed parcel or event data
+    changes; with schedule, changes of next_check_at / destination count
+    too (both counters only grow, so their sum changes with either).
+    """
+    row = conn.execute('SELECT revision, schedule_revision FROM data_revision WHERE id = 1').fetchone()
+    if not row:
+        return 0
+    return row[0] + row[1] if schedule else row[0]
+
+
+# (version, description, migration) - append only, never renumber
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "parcels and events tables", _v1_base_schema),
+    (2, "scheduling columns", _v2_scheduling),
+    (3, "resolved backend column", _v3_resolved_backend),
+    (4, "indexes for event history and due parcels", _v4_indexes),
+    (5, "notified_keys dedup table (replaces parcels.notified_events)", _v5_notified_keys),
+    (6, "event hashes for full-history ingestion", _v6_event_hashes),
+    (7, "carrier index for filtered parcel pages", _v7_carrier_index),
+    (8, "status_changes feed for live updates", _v8_status_changes),
+    (9, "data revision counter maintained by triggers", _v9_revision),
+    (10, "notification outbox", _v10_outbox),
+    (11, "revision bumped only by changed parcel columns", _v11_revision_guard),
+    (12, "rate limit, response cache and backend stats tables", _v12_helper_tables),
+    (13, "schedule revision for API ETags", _v13_schedule_revision),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending migrations, each in its own transaction together with
+    its user_version bump. Returns the resulting schema version.
+    """
+    current = schema_version(conn)
+    for version, _, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated meanwhile
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            apply(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        current = version
+    return current
+
+
+def connect(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """
+    Open a connection with the store's pragmas. The schema is brought up
+    to date the first time a process opens a given database.
+    """
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    if db_path not in _migrated:
+        with _migrate_lock:
+            if db_path not in _migrated:
+                migrate(conn)
+                _migrated.add(db_path)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Idle connections to one database. A connection is checked out by one
+    thread at a time and nested connection()/transaction() blocks on that
+    thread reuse it, so a helper called inside a transaction joins it.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, max_idle: int = 8):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _checkout(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return connect(self.db_path)
+
+    def _checkin(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """This thread's connection for the duration of the block."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._checkin(conn)
+
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Commit the block's writes, or roll them back if it raises.
+        immediate=True takes the write lock up front (read-then-write blocks).
+        Inside an open transaction the block simply joins it.
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = DB_PATH) -> ConnectionPool:
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path)
+        return pool
+
+
+def connection(db_path: str = DB_PATH):
+    """Pooled connection context manager (see ConnectionPool.connection)."""
+    return get_pool(db_path).connection()
+
+
+def transaction(db_path: str = DB_PATH, immediate: bool = False):
+    """Pooled transaction context manager (see ConnectionPool.transaction)."""
+    return get_pool(db_path).transaction(immediate)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Export formats for parcel-tracker (parcel_tracker.py export, GET /api/export).
+Turns the parcel records of parcel_tracker.iter_export() into JSON Lines
+(one parcel with its events per line) or CSV (one row per event; parcels
+without events get one row with empty event columns), one line at a time.
+Uses only standard library (no external dependencies).
+"""
+
+import csv
+import json
+from typing import Dict, Iterable, Iterator
+
+EXPORT_FORMATS = ("jsonl", "csv")
+
+CONTENT_TYPES = {
+    "jsonl": "application/x-ndjson; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+}
+
+PARCEL_FIELDS = ("tracking_number", "alias", "carrier", "status", "state", "last_event",
+                 "last_update", "destination", "archived", "created_at")
+EVENT_FIELDS = ("id", "date", "status", "location", "description")
+CSV_HEADER = PARCEL_FIELDS + tuple(f"event_{name}" for name in EVENT_FIELDS)
+
+
+class _Echo:
+    """File-like object whose write() returns the line, so csv.writer rows can be yielded."""
+
+    def write(self, line: str) -> str:
+        return line
+
+
+def jsonl_lines(parcels: Iterable[Dict]) -> Iterator[str]:
+    for parcel in parcels:
+        record = {name: parcel[name] for name in PARCEL_FIELDS}
+        record["events"] = parcel["events"]
+        yield json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def csv_lines(parcels: Iterable[Dict], header: bool = True) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    if header:
+        yield writer.writerow(CSV_HEADER)
+    for parcel in parcels:
+        fields = [parcel[name] for name in PARCEL_FIELDS]
+        fields[PARCEL_FIELDS.index("archived")] = int(parcel["archived"])
+        for event in parcel["events"] or [dict.fromkeys(EVENT_FIELDS)]:
+            yield writer.writerow(fields + [event[name] for name in EVENT_FIELDS])
+
+
+def export_header(fmt: str) -> str:
+    """Header line of fmt (the CSV column names; JSON Lines has none)."""
+    return csv.writer(_Echo()).writerow(CSV_HEADER) if fmt == "csv" else ""
+
+
+def export_lines(parcels: Iterable[Dict], fmt: str = "jsonl", header: bool = True) -> Iterator[str]:
+    """
+    Lines of an export in fmt (ValueError for an unknown format, raised now).
+    With header=False they are data records only: see export_header().
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format {fmt!r} (expected one of {', '.join(EXPORT_FORMATS)})")
+    return jsonl_lines(parcels) if fmt == "jsonl" else csv_lines(parcels, header)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Pooled HTTP client for parcel-tracker.
+Keeps keep-alive connections per host so repeated carrier lookups skip
+the TCP + TLS handshake, and transparently decodes gzip/deflate bodies.
+Uses only standard library (no external dependencies).
+"""
+
+import gzip
+import http.client
+import ssl
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
+from urllib.parse import urlsplit, urljoin
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+DEFAULT_USER_AGENT = f"Python-urllib/{sys.version_info.major}.{sys.version_info.minor}"
+
+# Errors meaning a kept-alive connection was closed by the server meanwhile
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+# Methods a stale connection may make us resend after the server could have received them
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+
+def decode_body(data: bytes, encoding: Optional[str]) -> bytes:
+    """Decode a gzip/deflate encoded response body."""
+    encoding = (encoding or "").strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(data)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(data)
+        except zlib.error:
+            # Some servers send raw deflate without the zlib header
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+    return data
+
+
+class ValidatorCache:
+    """
+    Remembers ETag / Last-Modified and the body per URL, so a GET can be
+    sent as a conditional request and a 304 answered from memory.
+    Only URLs whose server sent a validator are kept.
+    """
+
+    def __init__(self, capacity: int = 512):
+        self.capacity = capacity
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def headers_for(self, url: str) -> Dict[str, str]:
+        with self._lock:
+            entry = self._entries.get(url)
+        if not entry:
+            return {}
+        etag, last_modified, _ = entry
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def body_for(self, url: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry:
+                self._entries.move_to_end(url)
+        return entry[2] if entry else None
+
+    def store(self, url: str, headers, body: bytes):
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        with self._lock:
+            if not etag and not last_modified:
+                self._entries.pop(url, None)
+                return
+            self._entries[url] = (etag, last_modified, body)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+
+class HTTPPool:
+    """
+    Thread-safe pool of persistent http.client connections keyed by
+    (scheme, host, port). A connection is checked out for the duration of
+    one request, then returned to the pool unless the server closed it.
+    """
+
+    def __init__(self, max_idle_per_host: int = 8, idle_timeout: float = 60.0):
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[Tuple[str, str, int], list] = {}
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+        self.validators = ValidatorCache()
+        self.counters = {
+            "requests": 0,
+            "not_modified": 0,
+            "connections_opened": 0,
+            "connections_reused": 0,
+            "bytes_received": 0,
+            "bytes_decoded": 0,
+        }
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _checkout(self, key: Tuple[str, str, int], timeout: float):
+        """Return (connection, reused) for key, reusing an idle one when possible."""
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                conn, last_used = idle.pop()
+                if now - last_used < self.idle_timeout:
+                    self.counters["connections_reused"] += 1
+                    conn.timeout = timeout
+                    if conn.sock:
+                        conn.sock.settimeout(timeout)
+                    return conn, True
+                conn.close()
+            self.counters["connections_opened"] += 1
+
+        scheme, host, port = key
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        return conn, False
+
+    def _checkin(self, key: Tuple[str, str, int], conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def _send_once(self, method: str, url: str, headers: Dict, body: Optional[bytes],
+                   timeout: float) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        req_headers = {
+            "User-Agent": DEFAULT_USER_AGENT,
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+        req_headers.update(headers)
+
+        conn, reused = self._checkout(key, timeout)
+        try:
+            sent = False
+            try:
+                conn.request(method, path, body=body, headers=req_headers)
+                sent = True
+                resp = conn.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                # Once sent, the server may have acted on it before dropping the
+                # connection: resending a POST could register or deliver twice
+                if not reused or (sent and method not in IDEMPOTENT_METHODS):
+                    raise
+                # Server dropped the idle connection: retry once on a fresh one
+                conn.close()
+                self._count("connections_opened")
+                conn.connect()
+                conn.request(method, path, body=body, headers=req_headers)
+                resp = conn.getresponse()
+            data = resp.read()
+        except Exception:
+            conn.close()
+            raise
+
+        if resp.will_close:
+            conn.close()
+        else:
+            self._checkin(key, conn)
+
+        self._count("bytes_received", len(data))
+        data = decode_body(data, resp.headers.get("Content-Encoding"))
+        self._count("bytes_decoded", len(data))
+        return resp.status, resp.headers, data
+
+    def request(self, method: str, url: str, headers: Optional[Dict] = None, body: Optional[bytes] = None,
+                timeout: float = 30, max_redirects: int = 5,
+                conditional: bool = False) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        """
+        Send a request and return (status, headers, decoded body).
+        Redirects are followed like urllib does; HTTP errors are returned, not raised.
+        With conditional=True a GET carries the validators from the last
+        response for that URL, and a 304 is returned as 200 with the stored body.
+        """
+        headers = dict(headers or {})
+        for _ in range(max_redirects + 1):
+            self._count("requests")
+            send_headers = headers
+            if conditional and method == "GET":
+                send_headers = dict(headers, **self.validators.headers_for(url))
+            status, resp_headers, data = self._send_once(method, url, send_headers, body, timeout)
+            if status == 304 and conditional:
+                cached = self.validators.body_for(url)
+                if cached is not None:
+                    self._count("not_modified")
+                    return 200, resp_headers, cached
+            location = resp_headers.get("Location")
+            if status not in REDIRECT_STATUSES or not location:
+                if conditional and method == "GET" and status == 200:
+                    self.validators.store(url, resp_headers, data)
+                return status, resp_headers, data
+            url = urljoin(url, location)
+            if status == 303 or (status in (301, 302) and method == "POST"):
+                method, body = "GET", None
+                headers.pop("Content-Type", None)
+        return status, resp_headers, data
+
+    def stats(self) -> Dict:
+        """Counters plus the share of requests that skipped a handshake."""
+        with self._lock:
+            stats = dict(self.counters)
+        total = stats["connections_opened"] + stats["connections_reused"]
+        stats["reuse_ratio"] = stats["connections_reused"] / total if total else 0.0
+        return stats
+
+    def summary(self) -> str:
+        """One-line summary of the connection counters."""
+        s = self.stats()
+        return (f"HTTP: {s['requests']} request(s), {s['connections_opened']} connection(s) opened, "
+                f"{s['connections_reused']} reused ({s['reuse_ratio']:.0%}), {s['not_modified']} not modified")
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
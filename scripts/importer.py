@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Streaming readers for bulk parcel imports (parcel_tracker.py import).
+Reads CSV/TSV, JSON arrays and JSON Lines one row at a time, so a large
+shop export is never loaded whole. Every row comes out as a dict with
+its row number: {"line", "tracking_number", "alias"}, or {"line",
+"error"} for a row that could not be read.
+Uses only standard library (no external dependencies).
+"""
+
+import csv
+import io
+import json
+import sys
+from typing import Dict, Iterator, Optional, TextIO
+
+FORMATS = ("csv", "json", "jsonl")
+
+# Header names accepted for the tracking number / alias columns (lowercase)
+NUMBER_COLUMNS = ("tracking_number", "tracking", "tracking number", "tracking_no", "number", "tn", "awb")
+ALIAS_COLUMNS = ("alias", "name", "label", "description", "order")
+
+JSON_READ_SIZE = 64 * 1024
+
+
+def guess_format(path: str) -> str:
+    """Import format from a file extension (csv for anything unknown)."""
+    name = path.lower()
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if name.endswith(".json"):
+        return "json"
+    return "csv"
+
+
+def _item(line: int, value) -> Dict:
+    """Row dict from a JSON value: "LP..." or {"tracking_number": ..., "alias": ...}."""
+    if isinstance(value, str):
+        return {"line": line, "tracking_number": value, "alias": None}
+    if isinstance(value, dict):
+        number = next((value[k] for k in NUMBER_COLUMNS if k in value), None)
+        alias = next((value[k] for k in ALIAS_COLUMNS if k in value), None)
+        if isinstance(number, (str, int)) and not isinstance(number, bool):
+            return {"line": line, "tracking_number": str(number),
+                    "alias": str(alias) if alias is not None else None}
+    return {"line": line, "error": "expected a tracking number or an object with tracking_number"}
+
+
+def read_csv(f: TextIO) -> Iterator[Dict]:
+    """
+    CSV/TSV rows. The delimiter (, ; tab |) is sniffed from the start of
+    the file; a header row naming the columns is used if present,
+    otherwise the first column is the number and the second the alias.
+    """
+    sample = f.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    rows = csv.reader(_chain(sample, f), dialect)
+    number_col, alias_col = 0, 1
+    first = True
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        if first:
+            first = False
+            header = [cell.strip().lower() for cell in row]
+            found = [i for i, name in enumerate(header) if name in NUMBER_COLUMNS]
+            if found:
+                number_col = found[0]
+                aliases = [i for i, name in enumerate(header) if name in ALIAS_COLUMNS]
+                alias_col = aliases[0] if aliases else None
+                continue
+        number = row[number_col].strip() if number_col < len(row) else ""
+        alias = row[alias_col].strip() if alias_col is not None and alias_col < len(row) else ""
+        yield {"line": rows.line_num, "tracking_number": number, "alias": alias or None}
+
+
+def _chain(head: str, f: TextIO) -> Iterator[str]:
+    """Lines of head + the rest of f (head was read to sniff the format)."""
+    rest = f.readline()
+    yield from io.StringIO(head + rest)
+    yield from f
+
+
+def read_json_lines(f: TextIO) -> Iterator[Dict]:
+    """One JSON value (string or object) per line; blank lines are skipped."""
+    for line, text in enumerate(f, 1):
+        if not text.strip():
+            continue
+        try:
+            yield _item(line, json.loads(text))
+        except json.JSONDecodeError as e:
+            yield {"line": line, "error": f"invalid JSON: {e.msg}"}
+
+
+def read_json_array(f: TextIO) -> Iterator[Dict]:
+    """
+    Elements of a top-level JSON array, decoded one at a time from a
+    rolling buffer (or {"parcels": [...]} as accepted by POST /api/parcels,
+    which is small enough to load). Row numbers are 1-based element indexes.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(JSON_READ_SIZE).lstrip()
+    if buffer.startswith("{"):
+        try:
+            document = json.loads(buffer + f.read())
+        except json.JSONDecodeError as e:
+            yield {"line": 1, "error": f"invalid JSON: {e.msg}"}
+            return
+        for line, value in enumerate(document.get("parcels") or [], 1):
+            yield _item(line, value)
+        return
+    if not buffer.startswith("["):
+        yield {"line": 1, "error": "expected a JSON array"}
+        return
+    pos, line, eof = 1, 0, False
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+            complete = end < len(buffer) or eof  # a number may go on in the next read
+        except json.JSONDecodeError as e:
+            if eof:
+                yield {"line": line + 1, "error": f"invalid JSON: {e.msg}"}
+                return
+            complete = False
+        if not complete:
+            # Element cut at the buffer end: read more and retry
+            more = f.read(JSON_READ_SIZE)
+            eof = not more
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        line += 1
+        yield _item(line, value)
+        pos = end
+        if pos > JSON_READ_SIZE:
+            buffer, pos = buffer[pos:], 0
+
+
+READERS = {"csv": read_csv, "json": read_json_array, "jsonl": read_json_lines}
+
+
+def read_parcel_file(path: str, fmt: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Stream the rows of an import file ("-" reads standard input). The
+    format and the file are checked now (ValueError, OSError); rows are
+    read as the result is iterated.
+    """
+    fmt = fmt or guess_format(path)
+    if fmt not in READERS:
+        raise ValueError(f"unknown import format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    if path == "-":
+        return READERS[fmt](sys.stdin)
+    return _read_and_close(READERS[fmt], open(path, newline="", encoding="utf-8-sig"))
+
+
+def _read_and_close(reader, f: TextIO) -> Iterator[Dict]:
+    with f:
+        yield from reader(f)
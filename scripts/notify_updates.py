@@ -1,59 +1,48 @@
 #!/usr/bin/env python3
 """
-Notification script for parcel-tracker.
-Sends formatted updates via OpenClaw messaging.
+Notification dispatcher for parcel-tracker.
+Sends the updates queued in the notification outbox (by check_updates)
+to their sinks (OpenClaw messaging by default, see sinks.py), without
+checking parcels itself. With --watch it keeps dispatching, so
+notifications go out independently of the checks.
 """
 
-import subprocess
-import json
+import argparse
 import sys
 import os
+import time
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from parcel_tracker import check_updates, get_carrier_display_name
+from outbox import dispatch, format_dispatch_stats, outbox_counts, COALESCE_WINDOW, DISPATCH_WORKERS
 
 def main():
-    """Check for updates and notify if any found."""
-    updates = check_updates()
+    """Dispatch pending notifications (once, or every --watch seconds)."""
+    parser = argparse.ArgumentParser(description="Send queued parcel notifications")
+    parser.add_argument("--window", type=int, default=COALESCE_WINDOW,
+                        help="seconds pending updates wait to be coalesced into one message (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=DISPATCH_WORKERS,
+                        help="number of messages sent in parallel (default: %(default)s)")
+    parser.add_argument("--flush", action="store_true",
+                        help="send everything pending now, ignoring the coalescing window")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="keep running, dispatching every SECONDS")
+    args = parser.parse_args()
     
-    if not updates:
-        print("No updates to notify")
-        return
+    while True:
+        stats = dispatch(window=args.window, workers=args.workers, flush=args.flush)
+        if stats["messages"] or stats["retrying"] or stats["given_up"] or not args.watch:
+            print(format_dispatch_stats(stats), flush=True)
+        if not args.watch:
+            break
+        try:
+            time.sleep(args.watch)
+        except KeyboardInterrupt:
+            break
     
-    # Build notification message
-    if len(updates) == 1:
-        u = updates[0]
-        carrier = get_carrier_display_name(u["carrier"]) if u["carrier"] else "Unknown"
-        msg = f"📦 Tracking Update\n\n"
-        msg += f"{u['tracking_number']} ({carrier})\n"
-        msg += f"Status: {u['status']}\n"
-        msg += f"Event: {u['event'].get('description', 'N/A')}\n"
-        if u['event'].get('location'):
-            msg += f"Location: {u['event']['location']}\n"
-        if u['event'].get('date'):
-            msg += f"Time: {u['event']['date']}\n"
-    else:
-        msg = f"📦 {len(updates)} Tracking Updates\n\n"
-        for u in updates:
-            carrier = get_carrier_display_name(u["carrier"]) if u["carrier"] else "Unknown"
-            msg += f"• {u['tracking_number']} ({carrier}): {u['status']}\n"
-    
-    # Send via openclaw message
-    # This will use the configured channel
-    result = subprocess.run(
-        ["openclaw", "message", "send", "--message", msg],
-        capture_output=True,
-        text=True
-    )
-    
-    if result.returncode == 0:
-        print(f"Notified {len(updates)} update(s)")
-    else:
-        print(f"Failed to send notification: {result.stderr}", file=sys.stderr)
-        # Print to stdout as fallback
-        print("\n" + "="*50)
-        print(msg)
-        print("="*50)
+    counts = outbox_counts()
+    print(f"Outbox: {counts.get('pending', 0)} pending, {counts.get('sent', 0)} sent, "
+          f"{counts.get('failed', 0)} failed")
+    return 1 if stats["undelivered"] else 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
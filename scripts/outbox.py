@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Notification outbox for parcel-tracker.
+check_updates() queues each new update in the `outbox` table, one row per
+recipient, in the transaction that records the update; dispatch() sends
+what is pending, decoupled from polling. A recipient's pending updates
+are coalesced into one message once the oldest has waited the coalescing
+window, messages go out on a small thread pool, and failed sends are
+retried with exponential backoff. An update is marked notified (in
+notified_keys) only once a send succeeded.
+Uses only standard library (no external dependencies).
+"""
+
+import json
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from db import DB_PATH, connection, transaction
+from scheduler import db_now, format_db_time
+from sinks import DEFAULT_SINK, Sink, get_routing
+
+# Seconds a recipient's oldest pending update waits for others to join its message
+COALESCE_WINDOW = int(os.environ.get("PARCEL_NOTIFY_WINDOW", "0"))
+# Messages sent at the same time
+DISPATCH_WORKERS = 4
+# Retries: RETRY_BASE * 2^(attempt - 1) seconds (capped, +-20% jitter), then the row is given up
+MAX_ATTEMPTS = 8
+RETRY_BASE = 60
+RETRY_MAX = 6 * 3600
+# Sent rows are kept this long (notified_keys keeps deduplicating after that)
+SENT_KEPT_DAYS = 7
+# Rows being sent are leased for this long (longer than a send can take)
+CLAIM_SECONDS = 300
+
+
+def enqueue(c, parcel_id: int, event_hash: str, update: Dict,
+            recipients: Optional[List[str]] = None) -> bool:
+    """
+    Queue an update for each recipient (the sinks its route picks by
+    default) unless it was already queued or notified; with no recipient
+    it is only marked notified. Returns True if it was new. Runs in the
+    caller's transaction (the caller commits). An invalid notify.json
+    queues it for DEFAULT_SINK: storing events never depends on it.
+    """
+    if recipients is None:
+        try:
+            recipients = get_routing().recipients(update)
+        except (OSError, ValueError) as e:
+            print(f"Invalid notification config, queueing for {DEFAULT_SINK!r}: {e}", file=sys.stderr)
+            recipients = [DEFAULT_SINK]
+    if not recipients:
+        c.execute('INSERT OR IGNORE INTO notified_keys (parcel_id, event_hash) VALUES (?, ?)',
+                  (parcel_id, event_hash))
+        return c.rowcount == 1
+    payload = json.dumps(update, ensure_ascii=False, separators=(",", ":"))
+    before = c.connection.total_changes
+    c.executemany('''
+        INSERT OR IGNORE INTO outbox (parcel_id, event_hash, recipient, payload)
+        SELECT ?, ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM notified_keys WHERE parcel_id = ? AND event_hash = ?)
+    ''', [(parcel_id, event_hash, recipient, payload, parcel_id, event_hash) for recipient in recipients])
+    return c.connection.total_changes > before
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before retry number `attempts` (1 = first retry)."""
+    delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _send(sink: Optional[Sink], recipient: str, updates: List[Dict]) -> Optional[str]:
+    """Error text, or None if the batch was delivered."""
+    if sink is None:
+        return f"no sink named {recipient!r}"
+    try:
+        sink.send(updates)
+        return None
+    except Exception as e:
+        return str(e) or type(e).__name__
+
+
+def _claim(now, window: int, flush: bool, sinks: Dict[str, Sink], stats: Dict) -> List[tuple]:
+    """
+    Pick the (recipient, rows) batches to send now (up to the sink's
+    batch_size rows each) and lease their rows for
+    CLAIM_SECONDS, so a concurrent dispatcher skips them (and a crashed one
+    leaves them to be retried).
+    """
+    with transaction(DB_PATH, immediate=True) as conn:
+        rows = conn.execute('''
+            SELECT id, recipient, parcel_id, event_hash, payload, attempts, created_at FROM outbox
+            WHERE state = 'pending' AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
+            ORDER BY id
+        ''', (format_db_time(now),)).fetchall()
+        by_recipient: Dict[str, List[tuple]] = {}
+        for row in rows:
+            by_recipient.setdefault(row[1], []).append(row)
+        ready_before = format_db_time(now - timedelta(seconds=window))
+        batches = []
+        for recipient, items in by_recipient.items():
+            if not flush and items[0][6] > ready_before:
+                stats["waiting"] += len(items)
+                continue
+            size = max(1, sinks[recipient].batch_size) if recipient in sinks else len(items)
+            for start in range(0, len(items), size):
+                batches.append((recipient, items[start:start + size]))
+        lease = format_db_time(now + timedelta(seconds=CLAIM_SECONDS))
+        conn.executemany('UPDATE outbox SET next_attempt_at = ? WHERE id = ?',
+                         [(lease, item[0]) for _, items in batches for item in items])
+    return batches
+
+
+def dispatch(window: Optional[int] = None, workers: int = DISPATCH_WORKERS,
+             sinks: Optional[Dict[str, Sink]] = None, flush: bool = False) -> Dict:
+    """
+    Send pending updates whose retry time has come. A recipient's updates
+    are handed to its sink together (batch_size at a time) once its
+    oldest one has waited `window` seconds (COALESCE_WINDOW by default;
+    flush=True sends regardless). Sends run on `workers` threads; their
+    results are written from this thread. Returns counts: "sent" updates in
+    "messages" batches, "retrying" and "given_up" updates, "waiting" ones
+    held back by the window, and the "undelivered" updates of failed sends.
+    """
+    window = COALESCE_WINDOW if window is None else window
+    sinks = get_routing().sinks if sinks is None else sinks
+    now = db_now()
+    stats = {"sent": 0, "messages": 0, "retrying": 0, "given_up": 0, "waiting": 0, "undelivered": []}
+
+    batches = _claim(now, window, flush, sinks, stats)
+    if batches:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {
+                pool.submit(_send, sinks.get(recipient), recipient,
+                            [json.loads(item[4]) for item in items]): items
+                for recipient, items in batches
+            }
+            for future in as_completed(futures):
+                _record(futures[future], future.result(), stats)
+
+    with transaction(DB_PATH) as conn:
+        conn.execute("DELETE FROM outbox WHERE state = 'sent' AND sent_at < ?",
+                     (format_db_time(now - timedelta(days=SENT_KEPT_DAYS)),))
+    return stats
+
+
+def _record(items: List[tuple], error: Optional[str], stats: Dict):
+    """Write the outcome of one message send (one transaction)."""
+    now = db_now()
+    with transaction(DB_PATH) as conn:
+        if error is None:
+            conn.executemany("UPDATE outbox SET state = 'sent', sent_at = ?, attempts = attempts + 1 WHERE id = ?",
+                             [(format_db_time(now), item[0]) for item in items])
+            conn.executemany('INSERT OR IGNORE INTO notified_keys (parcel_id, event_hash) VALUES (?, ?)',
+                             [(item[2], item[3]) for item in items])
+            stats["sent"] += len(items)
+            stats["messages"] += 1
+            return
+        print(f"Failed to send {len(items)} update(s) to {items[0][1]}: {error}", file=sys.stderr)
+        for item in items:
+            attempts = item[5] + 1
+            if attempts >= MAX_ATTEMPTS:
+                conn.execute("UPDATE outbox SET state = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                             (attempts, error, item[0]))
+                stats["given_up"] += 1
+            else:
+                retry_at = now + timedelta(seconds=retry_delay(attempts))
+                conn.execute("UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                             (attempts, format_db_time(retry_at), error, item[0]))
+                stats["retrying"] += 1
+            stats["undelivered"].append(json.loads(item[4]))
+
+
+def outbox_counts() -> Dict[str, int]:
+    """Number of outbox rows per state (pending, sent, failed)."""
+    with connection(DB_PATH) as conn:
+        return dict(conn.execute('SELECT state, COUNT(*) FROM outbox GROUP BY state').fetchall())
+
+
+def format_dispatch_stats(stats: Dict) -> str:
+    line = f"Sent {stats['sent']} update(s) in {stats['messages']} message(s)"
+    for key, label in (("retrying", "to retry"), ("given_up", "given up"), ("waiting", "waiting to coalesce")):
+        if stats.get(key):
+            line += f", {stats[key]} {label}"
+    return line
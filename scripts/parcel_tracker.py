@@ -9,188 +9,150 @@ import sys
 import os
 import json
 import sqlite3
-import re
-import urllib.request
-import urllib.error
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Tuple
+from typing import Callable, Optional, Dict, Iterable, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from rate_limiter import RateLimiter
+from http_client import HTTPPool
+from response_cache import ResponseCache
+from carrier_detection import (
+    detect_carrier, detect_carriers, detect_many, checked_carriers, verified_carrier, number_shape
+)
+from backend_stats import BackendStats
+from importer import read_parcel_file
+from exporter import export_header, export_lines
+from outbox import enqueue
+from scheduler import status_category, parse_event_time, next_check, db_now, format_db_time, STATUS_CATEGORIES
+from db import DB_PATH, connection, transaction, hash_key, event_hash, data_revision
 
-# Database path
-DB_PATH = os.path.expanduser("~/.openclaw/workspace/parcel-tracker/data/parcels.db")
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-def http_get(url: str, headers: Optional[Dict] = None, timeout: int = 30) -> Optional[Dict]:
-    """Make HTTP GET request and return JSON response."""
+# Parallel fetches used by `check` (1 = serial). Override with --workers.
+DEFAULT_WORKERS = int(os.environ.get("PARCEL_CHECK_WORKERS", "1"))
+
+# Max simultaneous requests per detected carrier during a parallel check
+CARRIER_CONCURRENCY = {
+    "colissimo": 4,
+    "chronopost": 4,
+    "cainiao": 8,
+    "yanwen": 2,
+    "gls": 4,
+    "dpd": 4,
+}
+DEFAULT_CARRIER_CONCURRENCY = 4
+
+# Keep-alive connections shared by every track_* function
+HTTP_POOL = HTTPPool()
+
+# Rows kept in status_changes (the web app's live feed)
+STATUS_CHANGES_KEPT = 10000
+
+# Hedged lookups (track_parcel): once the carrier APIs failed or are still
+# running after this many seconds, the universal trackers are raced instead
+# of chained. A negative value keeps the strict sequential chain.
+HEDGE_AFTER = float(os.environ.get("PARCEL_HEDGE_AFTER", "3"))
+# Trackers with a daily quota only join the race when PARCEL_HEDGE_QUOTA=1;
+# otherwise they run in order once every free backend came back empty.
+QUOTA_BACKENDS = ("tracktry", "17track")
+HEDGE_QUOTA = os.environ.get("PARCEL_HEDGE_QUOTA") == "1"
+HEDGE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
+# Recent tracking results per tracking number (memory LRU + response_cache table).
+# Set PARCEL_CACHE_DB=0 to keep the cache in memory only.
+RESPONSE_CACHE = ResponseCache(db_path=DB_PATH if os.environ.get("PARCEL_CACHE_DB", "1") != "0" else None)
+
+# Which backend actually answered, per number shape (backend_stats table)
+BACKEND_STATS = BackendStats(DB_PATH)
+
+# Shared per-carrier throttling (state persisted in the parcels DB)
+RATE_LIMITER = RateLimiter(DB_PATH)
+RETRY_STATUSES = (429, 503)
+MAX_RETRIES = 3
+
+def _fetch(method: str, url: str, headers: Dict, body: Optional[bytes], timeout: int,
+           rate_key: Optional[str], rate_cost: int = 1, conditional: bool = False) -> Optional[Tuple[int, bytes]]:
+    """
+    Send a request through the rate limiter.
+    Throttling responses (429/503) back off and retry up to MAX_RETRIES times.
+    Returns (status, body) or None if the limiter refused the request.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        if rate_key and not RATE_LIMITER.acquire(rate_key, rate_cost):
+            print(f"Rate limit: skipping {rate_key} request (quota spent or backing off)", file=sys.stderr)
+            return None
+        status, resp_headers, data = HTTP_POOL.request(method, url, headers, body, timeout,
+                                                       conditional=conditional)
+        if status in RETRY_STATUSES and rate_key and attempt < MAX_RETRIES:
+            delay = RATE_LIMITER.backoff(rate_key, resp_headers.get("Retry-After") if resp_headers else None)
+            print(f"HTTP {status} from {rate_key}, backing off {delay:.1f}s", file=sys.stderr)
+            continue
+        if rate_key and status < 400:
+            RATE_LIMITER.record_success(rate_key)
+        return status, data
+    return None
+
+def http_get(url: str, headers: Optional[Dict] = None, timeout: int = 30,
+             rate_key: Optional[str] = None) -> Optional[Dict]:
+    """
+    Make HTTP GET request and return JSON response.
+    Sent as a conditional request (ETag / If-Modified-Since) when the
+    carrier returned validators for this URL before.
+    """
     try:
-        req = urllib.request.Request(url, headers=headers or {})
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            if resp.status == 200:
-                data = resp.read().decode('utf-8')
+        response = _fetch("GET", url, headers or {}, None, timeout, rate_key, conditional=True)
+        if response:
+            status, body = response
+            if status == 200:
+                data = body.decode('utf-8')
                 try:
                     return json.loads(data)
                 except json.JSONDecodeError:
                     return {"raw": data}
+            print(f"HTTP GET error: HTTP {status}", file=sys.stderr)
     except Exception as e:
         print(f"HTTP GET error: {e}", file=sys.stderr)
     return None
 
-def http_post(url: str, data: Dict, headers: Optional[Dict] = None, timeout: int = 30) -> Optional[Dict]:
+def http_get_text(url: str, headers: Optional[Dict] = None, timeout: int = 30,
+                  rate_key: Optional[str] = None) -> Optional[str]:
+    """Make HTTP GET request and return the body as text (for HTML tracking pages)."""
+    try:
+        response = _fetch("GET", url, headers or {}, None, timeout, rate_key)
+        if response and response[0] < 400:
+            return response[1].decode('utf-8', errors='ignore')
+    except Exception as e:
+        print(f"HTTP GET error: {e}", file=sys.stderr)
+    return None
+
+def http_post(url: str, data, headers: Optional[Dict] = None, timeout: int = 30,
+              rate_key: Optional[str] = None, rate_cost: int = 1) -> Optional[Dict]:
     """Make HTTP POST request with JSON body."""
     try:
         req_headers = headers or {}
         req_headers['Content-Type'] = 'application/json'
         json_data = json.dumps(data).encode('utf-8')
-        req = urllib.request.Request(url, data=json_data, headers=req_headers, method='POST')
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            if resp.status == 200:
-                return json.loads(resp.read().decode('utf-8'))
+        response = _fetch("POST", url, req_headers, json_data, timeout, rate_key, rate_cost)
+        if response:
+            status, body = response
+            if status == 200:
+                return json.loads(body.decode('utf-8'))
+            print(f"HTTP POST error: HTTP {status}", file=sys.stderr)
     except Exception as e:
         print(f"HTTP POST error: {e}", file=sys.stderr)
     return None
 
 def init_db():
-    """Initialize SQLite database for parcel tracking."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS parcels (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            tracking_number TEXT UNIQUE NOT NULL,
-            alias TEXT,
-            carrier TEXT,
-            carrier_detected TEXT,
-            status TEXT,
-            last_event TEXT,
-            last_update TEXT,
-            destination TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            notified_events TEXT DEFAULT '[]'
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            parcel_id INTEGER,
-            timestamp TEXT,
-            status TEXT,
-            location TEXT,
-            description TEXT,
-            FOREIGN KEY (parcel_id) REFERENCES parcels(id)
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def detect_carrier(tracking_number: str) -> Optional[str]:
-    """
-    Detect carrier from tracking number pattern.
-    Returns carrier code or None if unknown.
-    """
-    tn = tracking_number.upper().replace(" ", "").replace("-", "")
-    
-    patterns = {
-        # DPD - Test before generic numeric patterns
-        "dpd": [
-            r"^\d{14}$",
-            r"^\d{18}$",
-        ],
-        # GLS - Test before generic numeric patterns
-        "gls": [
-            r"^\d{11,12}$",
-            r"^\d{20}$",
-        ],
-        # La Poste / Colissimo (France)
-        "colissimo": [
-            r"^\d{13}$",  # 13 digits standard
-            r"^[A-Z0-9]{11,15}$",  # Alphanumeric (includes 8L...)
-            r"^[A-Z]{2}\d{9}[A-Z]{2}$",  # International (CJ, EK, etc.)
-            r"^6P\d{9}$",  # Colissimo pickups
-        ],
-        # Chronopost
-        "chronopost": [
-            r"^\d{13}$",
-            r"^XX\d{9}[A-Z]{2}$",
-        ],
-        # UPS
-        "ups": [
-            r"^1Z[A-Z0-9]{16}$",
-            r"^\d{12}$",
-            r"^T\d{10}$",
-        ],
-        # FedEx
-        "fedex": [
-            r"^\d{12}$",
-            r"^\d{15}$",
-            r"^\d{20}$",
-            r"^\d{34}$",
-        ],
-        # DHL
-        "dhl": [
-            r"^\d{10}$",
-            r"^\d{11}$",
-            r"^JJD\d{15,25}$",
-            r"^\d{20,25}$",
-        ],
-        # USPS
-        "usps": [
-            r"^(94|93|92|94|95)\d{20}$",
-            r"^\d{20,22}$",
-            r"^[A-Z]{2}\d{9}[A-Z]{2}$",
-            r"^EA\d{9}[A-Z]{2}$",
-        ],
-        # Royal Mail
-        "royalmail": [
-            r"^[A-Z]{2}\d{9}GB$",
-            r"^\d{13}$",
-        ],
-        # Hermes/Evri (UK)
-        "evri": [
-            r"^\d{16}$",
-        ],
-        # Mondial Relay
-        "mondialrelay": [
-            r"^\d{8}$",
-        ],
-        # InPost
-        "inpost": [
-            r"^\d{24}$",
-        ],
-        # Amazon Logistics
-        "amazon": [
-            r"^TBA\d{12}$",
-            r"^TBC\d{12}$",
-            r"^TBM\d{12}$",
-        ],
-        # Cainiao / AliExpress (China)
-        "cainiao": [
-            r"^CN[A-Z]{2}\d{9,15}[A-Z]{2}$",  # CNFR...HD format
-            r"^LP\d{14}$",  # AliExpress standard
-            r"^\d{14}$",  # Chinese domestic
-        ],
-        # Yanwen (Chinese carrier)
-        "yanwen": [
-            r"^\d{12,14}$",  # Standard Yanwen
-            r"^YT\d{16}$",  # YT prefix
-            r"^UF\d{14}$",  # UF prefix
-        ],
-        # Sunyou (Chinese carrier)
-        "sunyou": [
-            r"^SY\d{10,14}$",
-            r"^\d{11}Y$",
-        ],
-        # 4PX (Chinese logistics)
-        "4px": [
-            r"^\d{12,15}$",
-            r"^LX\d{12}CN$",
-        ],
-    }
-    
-    for carrier, regexes in patterns.items():
-        for pattern in regexes:
-            if re.match(pattern, tn):
-                return carrier
-    
-    return None
+    """
+    Create or upgrade the SQLite database (see db.MIGRATIONS).
+    The pool already does this once per process; calling it is optional.
+    """
+    with connection(DB_PATH):
+        pass
 
 def get_carrier_display_name(carrier_code: str) -> str:
     """Get human-readable carrier name."""
@@ -230,7 +192,7 @@ def track_with_tracktry(tracking_number: str, carrier: Optional[str] = None) ->
     headers = {"Tracktry-Api-Key": api_key}
     
     try:
-        data = http_get(url, headers)
+        data = http_get(url, headers, rate_key="tracktry")
         if data and data.get("code") == 200:
             result = data.get("data", {})
             events = result.get("origin_info", {}).get("trackinfo", [])
@@ -265,42 +227,55 @@ def format_timestamp(ts) -> str:
     except:
         return str(ts)
 
-def track_cainiao(tracking_number: str) -> Optional[Dict]:
+def _parse_cainiao_detail(detail: Dict) -> Dict:
+    """Normalize one entry of Cainiao's detail.json `module` list."""
+    events = detail.get("detailList", [])
+    return {
+        "carrier": "cainiao",
+        "status": detail.get("statusDesc"),
+        "events": [
+            {
+                "date": format_timestamp(e.get("time")),
+                "status": e.get("status"),
+                "location": e.get("place", ""),
+                "description": e.get("desc"),
+            }
+            for e in events
+        ],
+    }
+
+def track_cainiao_batch(tracking_numbers: List[str]) -> Dict[str, Dict]:
     """
-    Track Cainiao/AliExpress parcels using the public Cainiao API.
-    No API key required.
+    Track several Cainiao/AliExpress parcels with one request
+    (detail.json accepts a comma-separated mailNos list).
+    Returns {tracking_number: result} for the numbers Cainiao knows.
     """
-    url = f"https://global.cainiao.com/global/detail.json?mailNos={tracking_number}&lang=en-US"
+    url = f"https://global.cainiao.com/global/detail.json?mailNos={','.join(tracking_numbers)}&lang=en-US"
+    results = {}
     
     try:
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.0"
         }
-        data = http_get(url, headers)
+        data = http_get(url, headers, rate_key="cainiao")
         
         if data and data.get("success"):
-            module = data.get("module", [])
-            if module and len(module) > 0:
-                detail = module[0]
-                events = detail.get("detailList", [])
-                
-                return {
-                    "carrier": "cainiao",
-                    "status": detail.get("statusDesc"),
-                    "events": [
-                        {
-                            "date": format_timestamp(e.get("time")),
-                            "status": e.get("status"),
-                            "location": e.get("place", ""),
-                            "description": e.get("desc"),
-                        }
-                        for e in events
-                    ],
-                }
+            for i, detail in enumerate(data.get("module") or []):
+                number = detail.get("mailNo") or (tracking_numbers[i] if i < len(tracking_numbers) else None)
+                if number:
+                    results[number] = _parse_cainiao_detail(detail)
     except Exception as e:
         print(f"Cainiao error: {e}", file=sys.stderr)
     
-    return None
+    return results
+
+def track_cainiao(tracking_number: str) -> Optional[Dict]:
+    """
+    Track Cainiao/AliExpress parcels using the public Cainiao API.
+    No API key required.
+    """
+    results = track_cainiao_batch([tracking_number])
+    return results.get(tracking_number) or next(iter(results.values()), None)
 
 def track_yanwen(tracking_number: str) -> Optional[Dict]:
     """
@@ -310,17 +285,15 @@ def track_yanwen(tracking_number: str) -> Optional[Dict]:
     url = f"http://www.yw56.com.cn/english/select-e.asp?wen={tracking_number}"
     
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            html = resp.read().decode('utf-8', errors='ignore')
-            # Basic parsing - look for tracking info in the HTML
-            if "Destination Country" in html or "Origin Country" in html:
-                # Simple heuristic extraction
-                return {
-                    "carrier": "yanwen",
-                    "status": "Tracked (see yanwen website for details)",
-                    "events": [{"date": "", "status": "Parcel found", "location": "", "description": f"Check {url} for full details"}],
-                }
+        html = http_get_text(url, {"User-Agent": "Mozilla/5.0"}, rate_key="yanwen")
+        # Basic parsing - look for tracking info in the HTML
+        if html and ("Destination Country" in html or "Origin Country" in html):
+            # Simple heuristic extraction
+            return {
+                "carrier": "yanwen",
+                "status": "Tracked (see yanwen website for details)",
+                "events": [{"date": "", "status": "Parcel found", "location": "", "description": f"Check {url} for full details"}],
+            }
     except Exception as e:
         print(f"Yanwen error: {e}", file=sys.stderr)
     
@@ -339,7 +312,7 @@ def track_gls(tracking_number: str) -> Optional[Dict]:
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
             "Accept": "application/json",
         }
-        data = http_get(url, headers)
+        data = http_get(url, headers, rate_key="gls")
         
         if data and data.get("tuStatus"):
             tu_status = data.get("tuStatus", [])
@@ -383,7 +356,7 @@ def track_dpd(tracking_number: str) -> Optional[Dict]:
         }
         
         # Try primary endpoint first
-        data = http_get(url, headers)
+        data = http_get(url, headers, rate_key="dpd")
         
         if data and data.get("shipments"):
             shipments = data.get("shipments", [])
@@ -406,57 +379,75 @@ def track_dpd(tracking_number: str) -> Optional[Dict]:
                 }
         
         # Fallback to web scraping if API doesn't return data
-        req = urllib.request.Request(alt_url, headers=headers)
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            html = resp.read().decode('utf-8', errors='ignore')
-            if "status" in html.lower() or "tracking" in html.lower():
-                return {
-                    "carrier": "dpd",
-                    "status": "Tracked (see DPD website for details)",
-                    "events": [{"date": "", "status": "Parcel found", "location": "", "description": f"Check {alt_url} for full details"}],
-                }
+        html = http_get_text(alt_url, headers, rate_key="dpd")
+        if html and ("status" in html.lower() or "tracking" in html.lower()):
+            return {
+                "carrier": "dpd",
+                "status": "Tracked (see DPD website for details)",
+                "events": [{"date": "", "status": "Parcel found", "location": "", "description": f"Check {alt_url} for full details"}],
+            }
     except Exception as e:
         print(f"DPD error: {e}", file=sys.stderr)
     
     return None
 
-def track_with_17track(tracking_number: str, carrier: Optional[str] = None) -> Optional[Dict]:
+def _parse_17track_item(track_info: Dict, carrier: Optional[str] = None) -> Dict:
+    """Normalize one tracking entry of a 17Track gettrackinfo response."""
+    providers = track_info.get("track_info", {}).get("tracking", {}).get("providers", [{}])
+    events = providers[0].get("events", []) if providers else []
+    
+    return {
+        "carrier": track_info.get("carrier", carrier),
+        "status": track_info.get("track_info", {}).get("status_description"),
+        "events": [
+            {
+                "date": e.get("time_iso"),
+                "status": e.get("status"),
+                "location": e.get("location"),
+                "description": e.get("description"),
+            }
+            for e in events
+        ],
+    }
+
+def track_with_17track_batch(tracking_numbers: List[str], carriers: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Dict]:
     """
-    Track parcel using 17Track API (free tier available).
-    Requires 17TRACK_API_KEY environment variable.
+    Track several parcels with one 17Track gettrackinfo call.
+    Each number counts against the daily quota.
+    Returns {tracking_number: result} for the numbers 17Track returned.
     """
     api_key = os.environ.get("17TRACK_API_KEY")
     if not api_key:
-        return None
+        return {}
+    carriers = carriers or {}
     
     url = "https://api.17track.net/track/v2.2/gettrackinfo"
     headers = {"17token": api_key}
-    payload = {"number": tracking_number}
+    payload = [{"number": n} for n in tracking_numbers]
+    results = {}
     
     try:
-        data = http_post(url, payload, headers)
+        data = http_post(url, payload, headers, rate_key="17track", rate_cost=len(tracking_numbers))
         if data and data.get("code") == 0 and data.get("data"):
-            track_info = data["data"][0]
-            providers = track_info.get("track_info", {}).get("tracking", {}).get("providers", [{}])
-            events = providers[0].get("events", []) if providers else []
-            
-            return {
-                "carrier": track_info.get("carrier", carrier),
-                "status": track_info.get("track_info", {}).get("status_description"),
-                "events": [
-                    {
-                        "date": e.get("time_iso"),
-                        "status": e.get("status"),
-                        "location": e.get("location"),
-                        "description": e.get("description"),
-                    }
-                    for e in events
-                ],
-            }
+            items = data["data"]
+            if isinstance(items, dict):
+                items = items.get("accepted", [])
+            for i, track_info in enumerate(items):
+                number = track_info.get("number") or (tracking_numbers[i] if i < len(tracking_numbers) else None)
+                if number:
+                    results[number] = _parse_17track_item(track_info, carriers.get(number))
     except Exception as e:
         print(f"17Track error: {e}", file=sys.stderr)
     
-    return None
+    return results
+
+def track_with_17track(tracking_number: str, carrier: Optional[str] = None) -> Optional[Dict]:
+    """
+    Track parcel using 17Track API (free tier available).
+    Requires 17TRACK_API_KEY environment variable.
+    """
+    results = track_with_17track_batch([tracking_number], {tracking_number: carrier})
+    return results.get(tracking_number) or next(iter(results.values()), None)
 
 def track_colissimo(tracking_number: str) -> Optional[Dict]:
     """
@@ -466,7 +457,7 @@ def track_colissimo(tracking_number: str) -> Optional[Dict]:
     url = f"https://www.laposte.fr/ssu/sun/suivi-unifie/{tracking_number}?lang=fr_FR"
     
     try:
-        data = http_get(url)
+        data = http_get(url, rate_key="colissimo")
         if data and "shipment" in data:
             shipment = data.get("shipment", {})
             events = shipment.get("event", [])
@@ -494,7 +485,7 @@ def track_chronopost(tracking_number: str) -> Optional[Dict]:
     url = f"https://www.chronopost.fr/tracking-cxf/tracking-cxf/getTrack?number={tracking_number}"
     
     try:
-        data = http_get(url)
+        data = http_get(url, rate_key="chronopost")
         if data and "list" in data:
             events = data.get("list", [])
             
@@ -516,185 +507,901 @@ def track_chronopost(tracking_number: str) -> Optional[Dict]:
     
     return None
 
-def track_parcel(tracking_number: str, carrier_hint: Optional[str] = None) -> Optional[Dict]:
+# Carrier-specific free APIs, tried before the universal trackers
+TRACKERS = {
+    "colissimo": track_colissimo,
+    "chronopost": track_chronopost,
+    "cainiao": track_cainiao,
+    "yanwen": track_yanwen,
+    "gls": track_gls,
+    "dpd": track_dpd,
+}
+
+# Carriers/backends with multi-number endpoints -> max numbers per request
+BATCH_SIZES = {
+    "cainiao": 20,
+    "17track": 40,
+}
+
+# Carrier-specific APIs tried per parcel (ranked candidates) before the universal trackers
+MAX_CARRIER_ATTEMPTS = 2
+
+def _try_backend(backend: str, tracking_number: str, detected: Optional[str],
+                 fallback: bool = False) -> Optional[Dict]:
+    """
+    Query one backend by name; the result records which backend answered.
+    A carrier API used as a universal fallback (Cainiao) does not claim
+    the parcel's carrier.
+    """
+    if backend in TRACKERS:
+        result = TRACKERS[backend](tracking_number)
+        if result and not fallback:
+            result["carrier_detected"] = backend
+    elif backend == "tracktry":
+        result = track_with_tracktry(tracking_number, detected)
+    elif backend == "17track":
+        result = track_with_17track(tracking_number, detected)
+    else:
+        return None
+    if result:
+        result["backend"] = backend
+    return result
+
+def _run_backends(backends: List[str], tracking_number: str, detected: Optional[str],
+                  fallback: bool = False) -> Optional[Dict]:
+    """Try backends one after another; first result wins."""
+    for backend in backends:
+        result = _try_backend(backend, tracking_number, detected, fallback)
+        if result:
+            return result
+    return None
+
+def _chain_plan(tracking_number: str, detected: Optional[str], tried: Tuple[str, ...] = (),
+                use_17track: bool = True, preferred: Optional[str] = None) -> Tuple[List[str], List[str]]:
+    """
+    Backends still to try, as (carrier stage, universal fallbacks).
+    The backend that served this parcel (or its number shape) before goes
+    first, then carrier APIs for the most likely carriers, then the universal
+    fallbacks. Candidates come from detect_carriers(), which already ruled
+    out carriers whose check digit does not match; when some carrier's check
+    digit passed, only those carriers are tried (the other matches are just
+    digit runs of the right length).
+    Backends listed in `tried` were already queried and are skipped.
+    """
+    primary = []
+    if preferred and preferred not in tried and (use_17track or preferred != "17track"):
+        primary.append(preferred)
+    
+    ranked = checked_carriers(tracking_number) or detect_carriers(tracking_number)
+    candidates = [detected] if detected else []
+    candidates += [c for c in ranked if c != detected]
+    attempts = 0
+    for carrier in candidates:
+        if carrier not in TRACKERS or carrier in tried or carrier in primary:
+            continue
+        if attempts >= MAX_CARRIER_ATTEMPTS:
+            break
+        attempts += 1
+        primary.append(carrier)
+    
+    # Free universal trackers (Tracktry has free tier), then Cainiao (works
+    # for many Chinese carriers) unless a check digit proved the parcel
+    # belongs to another carrier, then 17Track (if user has API key)
+    fallbacks = ["tracktry"]
+    if verified_carrier(tracking_number) in (None, "cainiao"):
+        fallbacks.append("cainiao")
+    if use_17track:
+        fallbacks.append("17track")
+    skip = set(tried) | set(primary)
+    return primary, [b for b in fallbacks if b not in skip]
+
+def _track_chain(tracking_number: str, detected: Optional[str], tried: Tuple[str, ...] = (),
+                 use_17track: bool = True, preferred: Optional[str] = None) -> Optional[Dict]:
+    """Strictly sequential lookup following _chain_plan()."""
+    primary, fallbacks = _chain_plan(tracking_number, detected, tried, use_17track, preferred)
+    return (_run_backends(primary, tracking_number, detected)
+            or _run_backends(fallbacks, tracking_number, detected, fallback=True))
+
+def _first_result(done) -> Optional[Dict]:
+    for future in done:
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Tracking error: {e}", file=sys.stderr)
+            continue
+        if result:
+            return result
+    return None
+
+def _hedged_chain(tracking_number: str, detected: Optional[str], preferred: Optional[str] = None,
+                  hedge_after: float = HEDGE_AFTER, hedge_quota: bool = HEDGE_QUOTA) -> Optional[Dict]:
+    """
+    Same backends as _track_chain(), but once the carrier stage failed or
+    took longer than hedge_after seconds, the universal fallbacks run
+    concurrently (alongside the still-running carrier stage) and the first
+    valid result wins; losers not started yet are cancelled, running ones
+    are left to finish and ignored.
+    Quota-limited backends are not launched speculatively unless
+    hedge_quota is set: they run in order only after everything else failed.
+    """
+    primary, fallbacks = _chain_plan(tracking_number, detected, preferred=preferred)
+    racing = [b for b in fallbacks if hedge_quota or b not in QUOTA_BACKENDS]
+    held = [b for b in fallbacks if b not in racing]
+    
+    pending = set()
+    if primary:
+        pending.add(HEDGE_POOL.submit(_run_backends, primary, tracking_number, detected))
+        done, pending = wait(pending, timeout=hedge_after)
+        result = _first_result(done)
+        if result:
+            return result
+    
+    pending |= {HEDGE_POOL.submit(_try_backend, b, tracking_number, detected, True) for b in racing}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        result = _first_result(done)
+        if result:
+            for future in pending:
+                future.cancel()
+            return result
+    
+    return _run_backends(held, tracking_number, detected, fallback=True)
+
+def track_parcel(tracking_number: str, carrier_hint: Optional[str] = None,
+                 use_cache: bool = True, max_age: Optional[float] = None,
+                 backend_hint: Optional[str] = None, hedge_after: Optional[float] = None) -> Optional[Dict]:
     """
     Track a parcel using the best available method.
     Auto-detects carrier if not provided.
     Tries free APIs first, no paid APIs required.
+    Results younger than the carrier's cache TTL (or max_age seconds)
+    are served from RESPONSE_CACHE without any network call.
+    backend_hint (or, failing that, what BACKEND_STATS learned for numbers
+    of the same shape) is tried before the usual chain.
+    Fallback trackers are hedged (see _hedged_chain) after hedge_after
+    seconds, HEDGE_AFTER by default; a negative value disables hedging.
     """
+    if use_cache:
+        cached = RESPONSE_CACHE.get(tracking_number, max_age)
+        if cached:
+            return cached
+    
     detected = carrier_hint or detect_carrier(tracking_number)
+    preferred = backend_hint or BACKEND_STATS.preferred(number_shape(tracking_number))
+    hedge_after = HEDGE_AFTER if hedge_after is None else hedge_after
+    if hedge_after < 0:
+        result = _track_chain(tracking_number, detected, preferred=preferred)
+    else:
+        result = _hedged_chain(tracking_number, detected, preferred, hedge_after)
+    if result:
+        RESPONSE_CACHE.put(tracking_number, result)
+    return result
+
+def _cainiao_batch_job(numbers: List[str]) -> Tuple[Dict[str, Dict], List[str]]:
+    """Batched Cainiao lookup; returns (found, numbers still to track one by one)."""
+    found = track_cainiao_batch(numbers)
+    for result in found.values():
+        result["carrier_detected"] = "cainiao"
+        result["backend"] = "cainiao"
+    return found, [n for n in numbers if n not in found]
+
+def _single_job(tracking_number: str, detected: Optional[str], tried: Tuple[str, ...],
+                preferred: Optional[str] = None) -> Tuple[Dict[str, Dict], List[str]]:
+    """Per-number lookup without 17Track (batched separately at the end)."""
+    result = _track_chain(tracking_number, detected, tried, use_17track=False, preferred=preferred)
+    return ({tracking_number: result}, []) if result else ({}, [tracking_number])
+
+def iter_track_many(tracking_numbers: List[str], hints: Optional[Dict[str, Optional[str]]] = None,
+                    workers: int = 1, carrier_limits: Optional[Dict[str, int]] = None,
+                    use_cache: bool = True, backends: Optional[Dict[str, Optional[str]]] = None):
+    """
+    Track many parcels, yielding (tracking_number, result or None) as results come in.
     
-    # Try carrier-specific free APIs first
-    trackers = {
-        "colissimo": track_colissimo,
-        "chronopost": track_chronopost,
-        "cainiao": track_cainiao,
-        "yanwen": track_yanwen,
-        "gls": track_gls,
-        "dpd": track_dpd,
-    }
+    Numbers are grouped by detected carrier (or hints[number]). Carriers with a
+    multi-number endpoint (BATCH_SIZES) are queried in batches; the rest, and
+    batch misses, go through the usual per-number chain. Parcels nothing else
+    found are sent to 17Track in batches last. Jobs run on `workers` threads,
+    capped per carrier by CARRIER_CONCURRENCY; results are yielded to the
+    calling thread. Fresh RESPONSE_CACHE entries are yielded first without
+    any request, and new results are stored in the cache.
     
-    if detected and detected in trackers:
-        result = trackers[detected](tracking_number)
-        if result:
-            result["carrier_detected"] = detected
-            return result
+    backends[number] (the backend that served it last time) or the backend
+    learned for its number shape routes it directly: Cainiao-served numbers
+    join the Cainiao batches, 17Track-served ones skip straight to the
+    17Track batches, others try that backend first.
+    """
+    hints = hints or {}
+    backends = backends or {}
     
-    # Try free universal trackers (Tracktry has free tier)
-    result = track_with_tracktry(tracking_number, detected)
-    if result:
-        return result
+    if use_cache:
+        pending = []
+        for number in tracking_numbers:
+            cached = RESPONSE_CACHE.get(number)
+            if cached:
+                yield number, cached
+            else:
+                pending.append(number)
+        tracking_numbers = pending
+    limits = dict(CARRIER_CONCURRENCY)
+    limits.update(carrier_limits or {})
     
-    # Try Cainiao as universal fallback (works for many Chinese carriers)
-    result = track_cainiao(tracking_number)
-    if result:
-        return result
+    detected = {n: hints.get(n) or detect_carrier(n) for n in tracking_numbers}
+    learned: Dict[str, Optional[str]] = {}
+    preferred = {}
+    for n in tracking_numbers:
+        shape = number_shape(n)
+        if shape not in learned:
+            learned[shape] = BACKEND_STATS.preferred(shape)
+        preferred[n] = backends.get(n) or learned[shape]
     
-    # Last resort: 17Track (if user has API key)
-    result = track_with_17track(tracking_number, detected)
-    if result:
-        return result
+    leftovers = [n for n in tracking_numbers if preferred[n] == "17track"]
+    routed = {
+        n: "cainiao" if preferred[n] == "cainiao" else detected[n]
+        for n in tracking_numbers if preferred[n] != "17track"
+    }
     
-    return None
+    # One job queue per carrier so a slow carrier cannot hog every worker
+    queues: Dict[str, deque] = {}
+    for carrier in dict.fromkeys(routed.values()):
+        group = [n for n in routed if routed[n] == carrier]
+        queue = queues.setdefault(carrier or "unknown", deque())
+        batched = [n for n in group if preferred[n] in (None, "cainiao")] if carrier == "cainiao" else []
+        if len(batched) > 1:
+            size = BATCH_SIZES["cainiao"]
+            for i in range(0, len(batched), size):
+                queue.append((_cainiao_batch_job, (batched[i:i + size],)))
+        else:
+            batched = []
+        queue.extend((_single_job, (n, detected[n], (), preferred[n])) for n in group if n not in batched)
+    
+    in_flight = {carrier: 0 for carrier in queues}
+    futures = {}
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while any(queues.values()) or futures:
+            for carrier, queue in queues.items():
+                cap = limits.get(carrier, DEFAULT_CARRIER_CONCURRENCY)
+                while queue and in_flight[carrier] < cap and len(futures) < max(1, workers):
+                    fn, args = queue.popleft()
+                    futures[pool.submit(fn, *args)] = (carrier, fn, args)
+                    in_flight[carrier] += 1
+            
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                carrier, fn, args = futures.pop(future)
+                in_flight[carrier] -= 1
+                try:
+                    found, missing = future.result()
+                except Exception as e:
+                    print(f"Tracking error ({carrier}): {e}", file=sys.stderr)
+                    found, missing = {}, (list(args[0]) if fn is _cainiao_batch_job else [args[0]])
+                
+                for number, result in found.items():
+                    RESPONSE_CACHE.put(number, result)
+                    yield number, result
+                if fn is _cainiao_batch_job:
+                    # Batch misses still deserve the full per-number chain
+                    queues[carrier].extend((_single_job, (n, detected[n], ("cainiao",))) for n in missing)
+                else:
+                    leftovers.extend(missing)
+    
+    # Last resort: 17Track, batched (each number still counts against the quota)
+    size = BATCH_SIZES["17track"]
+    for i in range(0, len(leftovers), size):
+        chunk = leftovers[i:i + size]
+        found = track_with_17track_batch(chunk, {n: detected[n] for n in chunk})
+        for number in chunk:
+            if found.get(number):
+                found[number]["backend"] = "17track"
+                RESPONSE_CACHE.put(number, found[number])
+            yield number, found.get(number)
+
+def track_many(tracking_numbers: List[str], hints: Optional[Dict[str, Optional[str]]] = None,
+               workers: int = 1, use_cache: bool = True) -> Dict[str, Optional[Dict]]:
+    """Track many parcels at once; returns {tracking_number: result or None}."""
+    return dict(iter_track_many(tracking_numbers, hints, workers, use_cache=use_cache))
 
 def add_parcel(tracking_number: str, alias: Optional[str] = None) -> Tuple[bool, str]:
     """Add a new parcel to tracking with optional alias."""
-    init_db()
     
     carrier = detect_carrier(tracking_number)
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
     try:
-        c.execute('''
-            INSERT INTO parcels (tracking_number, alias, carrier_detected, status)
-            VALUES (?, ?, ?, ?)
-        ''', (tracking_number, alias, carrier, "Added - pending first check"))
-        conn.commit()
-        
-        carrier_name = get_carrier_display_name(carrier) if carrier else "Unknown"
-        alias_str = f" [{alias}]" if alias else ""
-        return True, f"Added {tracking_number}{alias_str} ({carrier_name})"
+        with transaction(DB_PATH) as conn:
+            conn.execute('''
+                INSERT INTO parcels (tracking_number, alias, carrier_detected, status)
+                VALUES (?, ?, ?, ?)
+            ''', (tracking_number, alias, carrier, "Added - pending first check"))
     except sqlite3.IntegrityError:
         return False, f"Parcel {tracking_number} is already being tracked"
-    finally:
-        conn.close()
+    
+    carrier_name = get_carrier_display_name(carrier) if carrier else "Unknown"
+    alias_str = f" [{alias}]" if alias else ""
+    return True, f"Added {tracking_number}{alias_str} ({carrier_name})"
 
 def remove_parcel(tracking_number: str) -> Tuple[bool, str]:
     """Remove a parcel from tracking."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    c.execute('DELETE FROM parcels WHERE tracking_number = ?', (tracking_number,))
-    if c.rowcount > 0:
-        conn.commit()
-        conn.close()
+    with transaction(DB_PATH) as conn:
+        conn.execute('DELETE FROM notified_keys WHERE parcel_id IN (SELECT id FROM parcels WHERE tracking_number = ?)',
+                     (tracking_number,))
+        conn.execute('DELETE FROM outbox WHERE parcel_id IN (SELECT id FROM parcels WHERE tracking_number = ?)',
+                     (tracking_number,))
+        removed = conn.execute('DELETE FROM parcels WHERE tracking_number = ?', (tracking_number,)).rowcount
+    if removed > 0:
         return True, f"Removed {tracking_number}"
     else:
-        conn.close()
         return False, f"Parcel {tracking_number} not found"
 
-def list_parcels() -> List[Dict]:
-    """List all tracked parcels."""
-    init_db()
+PARCEL_COLUMNS = '''
+    id, tracking_number, alias, carrier_detected, status, last_event, last_update, destination,
+    state, next_check_at, archived, created_at
+'''
+
+def _parcel_dict(row) -> Dict:
+    return {
+        "id": row[0],
+        "tracking_number": row[1],
+        "alias": row[2],
+        "carrier": row[3],
+        "status": row[4],
+        "last_event": row[5],
+        "last_update": row[6],
+        "destination": row[7],
+        "state": row[8],
+        "next_check_at": row[9],
+        "archived": bool(row[10]),
+        "created_at": row[11],
+    }
+
+def list_parcels(include_archived: bool = True) -> List[Dict]:
+    """List tracked parcels (archived ones too unless include_archived is False)."""
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-        SELECT tracking_number, alias, carrier_detected, status, last_event, last_update, destination
-        FROM parcels ORDER BY created_at DESC
-    ''')
+    with connection(DB_PATH) as conn:
+        rows = conn.execute(
+            f'SELECT {PARCEL_COLUMNS} FROM parcels '
+            + ('' if include_archived else 'WHERE archived = 0 ') + 'ORDER BY created_at DESC'
+        ).fetchall()
     
-    parcels = []
-    for row in c.fetchall():
-        parcels.append({
-            "tracking_number": row[0],
-            "alias": row[1],
-            "carrier": row[2],
-            "status": row[3],
-            "last_event": row[4],
-            "last_update": row[5],
-            "destination": row[6],
-        })
+    return [_parcel_dict(row) for row in rows]
+
+def _parcel_filters(carrier: Optional[str], state: Optional[str],
+                    include_archived: bool) -> Tuple[List[str], List]:
+    where, args = [], []
+    if carrier:
+        where.append('carrier_detected = ?')
+        args.append(carrier)
+    if state:
+        where.append('state = ?')
+        args.append(state)
+    if not include_archived:
+        where.append('archived = 0')
+    return where, args
+
+# Rows per fetchmany() when streaming parcels/events from a cursor
+FETCH_SIZE = 200
+
+def _parcels_query(limit: Optional[int], cursor: Optional[str], carrier: Optional[str],
+                   state: Optional[str], include_archived: bool) -> Tuple[str, List]:
+    where, args = _parcel_filters(carrier, state, include_archived)
+    if cursor:
+        where.append('id < ?')
+        args.append(int(cursor))
+    sql = f'SELECT {PARCEL_COLUMNS} FROM parcels'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY id DESC'
+    if limit is not None:
+        sql += ' LIMIT ?'
+        args.append(limit)
+    return sql, args
+
+def _stream_rows(sql: str, args: List, shape: Callable):
+    """Yield shape(row) for each row, FETCH_SIZE rows in memory at a time."""
+    with connection(DB_PATH) as conn:
+        c = conn.execute(sql, args)
+        while True:
+            rows = c.fetchmany(FETCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield shape(row)
+
+def query_parcels(limit: int = 50, cursor: Optional[str] = None, carrier: Optional[str] = None,
+                  state: Optional[str] = None, include_archived: bool = True) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of parcels, newest first, optionally filtered by carrier and
+    status category (pending, in_transit, out_for_delivery, delivered,
+    exception). Keyset pagination on id: pass the returned cursor to get
+    the next page; it is None on the last page.
+    """
+    sql, args = _parcels_query(limit + 1, cursor, carrier, state, include_archived)
+    with connection(DB_PATH) as conn:
+        rows = conn.execute(sql, args).fetchall()
+    parcels = [_parcel_dict(row) for row in rows[:limit]]
+    next_cursor = str(parcels[-1]["id"]) if len(rows) > limit else None
+    return parcels, next_cursor
+
+def iter_parcels(limit: Optional[int] = None, cursor: Optional[str] = None, carrier: Optional[str] = None,
+                 state: Optional[str] = None, include_archived: bool = True):
+    """
+    Like query_parcels() but streamed from the cursor (limit None = all
+    remaining parcels). Arguments are validated now (ValueError for a bad
+    cursor), rows are read as the result is iterated.
+    """
+    sql, args = _parcels_query(limit, cursor, carrier, state, include_archived)
+    return _stream_rows(sql, args, _parcel_dict)
+
+def _date_bound(value: Optional[str], end: bool = False) -> Optional[str]:
+    """DB timestamp for a --from/--to date; a bare date as --to covers the whole day."""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)  # ValueError for a bad date
+    if end and len(value) == 10:
+        moment += timedelta(days=1)
+    return format_db_time(moment)
+
+def iter_export(carrier: Optional[str] = None, state: Optional[str] = None,
+                date_from: Optional[str] = None, date_to: Optional[str] = None,
+                after_event: Optional[int] = None):
+    """
+    Parcels with their stored events (oldest first), for export. Returns
+    (watermark, records): records is a generator of parcel dicts with an
+    "events" list, read from one cursor a parcel at a time, so memory does
+    not grow with the database. Filters: carrier, status category, date
+    the parcel was added (date_from/date_to, YYYY-MM-DD or a timestamp;
+    a bare date_to includes that day). With after_event, only events whose
+    id is above it are exported, and only parcels that have some.
+    watermark is the highest event id covered (events added while the
+    export runs are left for the next one); pass it back as after_event
+    for an incremental export. Arguments are checked now (ValueError).
+    """
+    where, args = _parcel_filters(carrier, state, True)
+    where = ['p.' + clause for clause in where]
+    start, end = _date_bound(date_from), _date_bound(date_to, end=True)
+    if start:
+        where.append('p.created_at >= ?')
+        args.append(start)
+    if end:
+        where.append('p.created_at < ?')
+        args.append(end)
+    with connection(DB_PATH) as conn:
+        watermark = conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+    event_filter = 'e.id <= ?'
+    event_args = [watermark]
+    if after_event is not None:
+        event_filter += ' AND e.id > ?'
+        event_args.append(int(after_event))
+        where.append('p.id IN (SELECT parcel_id FROM events WHERE id > ? AND id <= ?)')
+        args += [int(after_event), watermark]
+    columns = ', '.join('p.' + name.strip() for name in PARCEL_COLUMNS.split(','))
+    sql = f'''
+        SELECT {columns}, e.id, e.timestamp, e.status, e.location, e.description
+        FROM parcels p LEFT JOIN events e ON e.parcel_id = p.id AND {event_filter}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY p.id, e.timestamp, e.id
+    '''
+    return watermark, _group_export_rows(_stream_rows(sql, event_args + args, tuple))
+
+def _group_export_rows(rows):
+    """Fold consecutive (parcel columns..., event columns...) rows into parcel dicts."""
+    parcel = None
+    width = len(PARCEL_COLUMNS.split(','))
+    for row in rows:
+        if parcel is None or parcel["id"] != row[0]:
+            if parcel is not None:
+                yield parcel
+            parcel = _parcel_dict(row)
+            parcel["events"] = []
+        if row[width] is not None:
+            parcel["events"].append({
+                "id": row[width], "date": row[width + 1], "status": row[width + 2],
+                "location": row[width + 3], "description": row[width + 4],
+            })
+    if parcel is not None:
+        yield parcel
+
+def count_parcels(carrier: Optional[str] = None, state: Optional[str] = None,
+                  include_archived: bool = True) -> int:
+    where, args = _parcel_filters(carrier, state, include_archived)
+    sql = 'SELECT COUNT(*) FROM parcels' + (' WHERE ' + ' AND '.join(where) if where else '')
+    with connection(DB_PATH) as conn:
+        return conn.execute(sql, args).fetchone()[0]
+
+def get_parcel(tracking_number: str) -> Optional[Dict]:
+    with connection(DB_PATH) as conn:
+        row = conn.execute(f'SELECT {PARCEL_COLUMNS} FROM parcels WHERE tracking_number = ?',
+                           (tracking_number,)).fetchone()
+    return _parcel_dict(row) if row else None
+
+# Rows inserted per transaction by import_rows()/import_parcels()
+IMPORT_BATCH_SIZE = 500
+MAX_TRACKING_NUMBER_LENGTH = 64
+
+def _import_batch(batch: List[Dict], seen: Dict[str, str]) -> List[Dict]:
+    """
+    Validate a batch of import rows, detect their carriers in bulk and
+    insert the new ones with one executemany() in one transaction.
+    seen maps the numbers of earlier rows to where they were, to report
+    duplicates within the input. Returns one report entry per row.
+    """
+    report, rows = [], []
+    for item in batch:
+        number = item.get("tracking_number")
+        number = str(number).strip() if number is not None else ""
+        entry = {"tracking_number": number, "added": False}
+        if item.get("line") is not None:
+            entry["line"] = item["line"]
+        if item.get("error"):
+            entry["error"] = item["error"]
+        elif not number:
+            entry["error"] = "missing tracking number"
+        elif len(number) > MAX_TRACKING_NUMBER_LENGTH or not number.isprintable():
+            entry["error"] = "invalid tracking number"
+        elif number in seen:
+            entry.update(error=f"duplicate of {seen[number]}", duplicate=True)
+        else:
+            seen[number] = f"line {entry['line']}" if "line" in entry else "an earlier item"
+            rows.append((entry, number, item.get("alias") or None))
+        report.append(entry)
+    if not rows:
+        return report
     
-    conn.close()
-    return parcels
+    carriers = detect_many([number for _, number, _ in rows])
+    with transaction(DB_PATH, immediate=True) as conn:
+        existing = set()
+        numbers = [number for _, number, _ in rows]
+        for start in range(0, len(numbers), 500):
+            chunk = numbers[start:start + 500]
+            existing.update(row[0] for row in conn.execute(
+                f'SELECT tracking_number FROM parcels WHERE tracking_number IN ({",".join("?" * len(chunk))})', chunk))
+        new = []
+        for (entry, number, alias), carrier in zip(rows, carriers):
+            if number in existing:
+                entry.update(error="already tracked", duplicate=True)
+            else:
+                entry.update(added=True, carrier=carrier)
+                new.append((number, alias, carrier, "Added - pending first check"))
+        conn.executemany('''
+            INSERT INTO parcels (tracking_number, alias, carrier_detected, status) VALUES (?, ?, ?, ?)
+        ''', new)
+    return report
+
+def import_rows(items: Iterable[Dict], batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[Dict]:
+    """
+    Add parcels from {"tracking_number", "alias"[, "line"]} dicts, batch_size
+    rows per transaction. Yields one report entry per row, in order:
+    {"tracking_number", "added", "carrier"} or {..., "error"} (plus
+    "duplicate": True for numbers already tracked or repeated in the input,
+    and "line" when the row had one). Bad rows never abort the load.
+    """
+    seen = {}
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield from _import_batch(batch, seen)
+            batch = []
+    if batch:
+        yield from _import_batch(batch, seen)
+
+def import_parcels(path: str, fmt: Optional[str] = None,
+                   batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[Dict]:
+    """
+    Stream a CSV/JSON/JSON Lines file (see importer.py) into the database;
+    yields the import_rows() report. Raises ValueError for an unknown
+    format and OSError for an unreadable file before importing anything.
+    """
+    return import_rows(read_parcel_file(path, fmt), batch_size)
+
+def add_parcels(items: List[Dict]) -> List[Dict]:
+    """
+    Add many parcels at once. items are {"tracking_number", "alias"}
+    dicts; returns the import_rows() report (duplicates are reported, not
+    fatal).
+    """
+    return list(import_rows(items))
 
-def check_updates(notify: bool = True) -> List[Dict]:
+def ingest_events(c: sqlite3.Cursor, parcel_id: int, events: List[Dict]) -> int:
     """
-    Check all parcels for updates.
-    Returns list of parcels with new events.
+    Store a parcel's tracking events, skipping those already stored
+    (unique event_hash per parcel). Events come newest first and are
+    inserted oldest first. Returns the number of new events; the caller
+    commits.
     """
-    init_db()
+    rows = [
+        (parcel_id, e.get("date"), e.get("status"), e.get("location"), e.get("description"), event_hash(e))
+        for e in reversed(events)
+    ]
+    c.executemany('''
+        INSERT OR IGNORE INTO events (parcel_id, timestamp, status, location, description, event_hash)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+    # rowcount counts inserted rows only (total_changes also counts trigger writes)
+    return c.rowcount
+
+def store_tracking_result(tracking_number: str, result: Dict) -> int:
+    """Ingest the events of a result fetched outside check (e.g. the web app); 0 if not tracked."""
+    with transaction(DB_PATH) as conn:
+        c = conn.cursor()
+        row = c.execute('SELECT id FROM parcels WHERE tracking_number = ?', (tracking_number,)).fetchone()
+        if not row or not result.get("events"):
+            return 0
+        return ingest_events(c, row[0], result["events"])
+
+def _event_dict(row) -> Dict:
+    return {"date": row[0], "status": row[1], "location": row[2], "description": row[3]}
+
+def get_parcel_history(tracking_number: str, stream: bool = False) -> Optional[Dict]:
+    """
+    A tracked parcel with its stored event history (newest first), shaped
+    like a track_parcel() result plus "event_count"; None if the parcel is
+    not tracked. With stream=True, "events" is a generator reading them
+    from a cursor as it is iterated.
+    """
+    with connection(DB_PATH) as conn:
+        row = conn.execute('''
+            SELECT id, alias, carrier_detected, status, last_checked_at,
+                   (SELECT COUNT(*) FROM events WHERE parcel_id = parcels.id)
+            FROM parcels WHERE tracking_number = ?
+        ''', (tracking_number,)).fetchone()
+    if not row:
+        return None
+    events = _stream_rows('''
+        SELECT timestamp, status, location, description FROM events
+        WHERE parcel_id = ? ORDER BY timestamp DESC, id DESC
+    ''', [row[0]], _event_dict)
+    return {
+        "tracking_number": tracking_number,
+        "alias": row[1],
+        "carrier": row[2],
+        "status": row[3],
+        "last_checked_at": row[4],
+        "event_count": row[5],
+        "events": events if stream else list(events),
+    }
+
+def unarchive_parcel(tracking_number: str) -> Tuple[bool, str]:
+    """Put an archived parcel back into the active check schedule."""
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT id, tracking_number, alias, carrier_detected, notified_events FROM parcels')
+    with transaction(DB_PATH) as conn:
+        found = conn.execute('UPDATE parcels SET archived = 0, next_check_at = NULL WHERE tracking_number = ?',
+                             (tracking_number,)).rowcount > 0
+    if found:
+        return True, f"{tracking_number} is active again"
+    return False, f"Parcel {tracking_number} not found"
+
+def check_updates(notify: bool = True, workers: Optional[int] = None,
+                  carrier_limits: Optional[Dict[str, int]] = None,
+                  stats: Optional[Dict] = None, due_only: bool = True,
+                  progress: Optional[Callable[[int, int, List[Dict]], None]] = None,
+                  stop: Optional[threading.Event] = None) -> List[Dict]:
+    """
+    Check parcels for updates.
+    Returns list of parcels with new events. With notify, each new update
+    is also queued in the notification outbox (see outbox.py dispatch());
+    without, it is only marked as seen.
     
-    updates = []
+    Only active parcels whose next_check_at has passed are fetched unless
+    due_only is False; each checked parcel gets a new next_check_at from
+    the scheduler, and delivered or stale parcels are archived.
+    Parcels are fetched through iter_track_many(), so carriers with
+    multi-number endpoints are queried in batches. workers > 1 fetches
+    concurrently (see CARRIER_CONCURRENCY for the per-carrier caps).
+    Every returned event is stored in `events` (see ingest_events), but
+    only a new latest event is reported.
+    If a stats dict is given it is filled with the number of parcels
+    checked, parcels not due yet, events stored, elapsed wall-clock
+    seconds and parcels/sec.
+    progress(done, total, updates) is called once before fetching and
+    after every parcel (e.g. for the web app's background checks).
+    Setting stop ends the run after the current parcel (parcels not
+    reached keep their next_check_at; stats["stopped"] is set).
+    """
+    started = time.monotonic()
+    now = db_now()
     
-    for row in c.fetchall():
-        parcel_id, tracking_number, alias, carrier, notified_json = row
-        notified = json.loads(notified_json or "[]")
+    with connection(DB_PATH) as conn:
+        c = conn.cursor()
+        query = '''
+            SELECT id, tracking_number, alias, carrier_detected, status, last_update, created_at, resolved_backend
+            FROM parcels
+        '''
+        if due_only:
+            query += 'WHERE archived = 0 AND (next_check_at IS NULL OR next_check_at <= ?)'
+            c.execute(query, (format_db_time(now),))
+        else:
+            c.execute(query)
+        rows = c.fetchall()
+        total = c.execute('SELECT COUNT(*) FROM parcels').fetchone()[0]
+        
+        by_number = {row[1]: row for row in rows}
+        hints = {row[1]: row[3] for row in rows}
+        backends = {row[1]: row[7] for row in rows}
         
-        result = track_parcel(tracking_number, carrier)
+        updates = []
+        schedule = []
+        new_events = 0
+        done = 0
+        if progress:
+            progress(0, len(rows), updates)
         
-        if result and result.get("events"):
-            latest = result["events"][0]
-            event_key = f"{latest.get('date')}_{latest.get('status')}"
+        def flush_schedule():
+            c.executemany('''
+                UPDATE parcels SET state = ?, next_check_at = ?, last_checked_at = ?, archived = ?,
+                    resolved_backend = COALESCE(?, resolved_backend)
+                WHERE id = ?
+            ''', schedule)
+            conn.commit()
+            schedule.clear()
+        
+        fetched = iter_track_many(list(by_number), hints, workers or DEFAULT_WORKERS, carrier_limits,
+                                  backends=backends)
+        for number, result in fetched:
+            parcel_id, tracking_number, alias, carrier, old_status, last_update, created_at, resolved = by_number[number]
+            
+            # Learn which backend serves this kind of number (cache hits taught nothing new)
+            backend = (result or {}).get("backend")
+            if not (result and "cached_at" in result):
+                shape = number_shape(tracking_number)
+                tried_first = resolved or BACKEND_STATS.preferred(shape)
+                if backend:
+                    BACKEND_STATS.record(shape, backend, True)
+                if tried_first and tried_first != backend:
+                    BACKEND_STATS.record(shape, tried_first, False)
             
-            if event_key not in notified:
-                # New event!
-                updates.append({
+            if result and result.get("events"):
+                # Every event not stored yet, including scans between two checks
+                new_events += ingest_events(c, parcel_id, result["events"])
+                
+                latest = result["events"][0]
+                event_key = f"{latest.get('date')}_{latest.get('status')}"
+                
+                update = {
                     "parcel_id": parcel_id,
                     "tracking_number": tracking_number,
                     "alias": alias,
                     "carrier": result.get("carrier", carrier),
                     "status": result.get("status"),
                     "event": latest,
-                })
-                
-                # Update database
-                notified.append(event_key)
-                c.execute('''
-                    UPDATE parcels 
-                    SET status = ?, last_event = ?, last_update = ?, notified_events = ?
-                    WHERE id = ?
-                ''', (
-                    result.get("status"),
-                    latest.get("description"),
-                    latest.get("date"),
-                    json.dumps(notified),
-                    parcel_id
-                ))
-                
-                # Store event in history
-                c.execute('''
-                    INSERT INTO events (parcel_id, timestamp, status, location, description)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    parcel_id,
-                    latest.get("date"),
-                    latest.get("status"),
-                    latest.get("location"),
-                    latest.get("description"),
-                ))
-    
-    conn.commit()
-    conn.close()
+                }
+                # Unique keys make the insert the dedup check: queued in the
+                # outbox for the routed sinks (marked notified once sent), or
+                # marked right away
+                if notify:
+                    update_carrier = update["carrier"]
+                    is_new = enqueue(c, parcel_id, hash_key(event_key), dict(
+                        update, carrier_name=get_carrier_display_name(update_carrier) if update_carrier else "Unknown"))
+                else:
+                    c.execute('INSERT OR IGNORE INTO notified_keys (parcel_id, event_hash) VALUES (?, ?)',
+                              (parcel_id, hash_key(event_key)))
+                    is_new = c.rowcount == 1
+                if is_new:
+                    # New event!
+                    updates.append(update)
+                    
+                    # Update database
+                    c.execute('''
+                        UPDATE parcels 
+                        SET status = ?, last_event = ?, last_update = ?
+                        WHERE id = ?
+                    ''', (
+                        result.get("status"),
+                        latest.get("description"),
+                        latest.get("date"),
+                        parcel_id
+                    ))
+                    # Feed for live dashboards (web app /events)
+                    c.execute('''
+                        INSERT INTO status_changes (parcel_id, tracking_number, status, state, last_event, last_update)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (
+                        parcel_id,
+                        tracking_number,
+                        result.get("status"),
+                        status_category(result.get("status")),
+                        latest.get("description"),
+                        latest.get("date"),
+                    ))
+                # Commit per parcel: fetch threads need the DB for rate-limit state
+                conn.commit()
+            
+            # Schedule the next check from the freshest status we know
+            if result:
+                state = status_category(result.get("status"))
+                events = result.get("events") or []
+                last_event_at = parse_event_time(events[0].get("date")) if events else None
+            else:
+                state = status_category(old_status)
+                last_event_at = parse_event_time(last_update) or parse_event_time(created_at)
+            next_at, archive = next_check(state, (result or {}).get("carrier_detected") or carrier, last_event_at, now)
+            schedule.append((state, format_db_time(next_at) if next_at else None, format_db_time(now),
+                             1 if archive else 0, backend, parcel_id))
+            if len(schedule) >= 200:
+                flush_schedule()
+            done += 1
+            if progress:
+                progress(done, len(rows), updates)
+            if stop is not None and stop.is_set():
+                fetched.close()
+                break
+        
+        flush_schedule()
+        # Only recent changes are needed to resume live streams
+        c.execute('''
+            DELETE FROM status_changes WHERE id <= (SELECT MAX(id) FROM status_changes) - ?
+        ''', (STATUS_CHANGES_KEPT,))
+        conn.commit()
+    BACKEND_STATS.flush()
+    
+    if stats is not None:
+        elapsed = time.monotonic() - started
+        stats["parcels"] = done
+        stats["not_due"] = total - len(rows)
+        stats["stopped"] = done < len(rows)
+        stats["events"] = new_events
+        stats["elapsed"] = elapsed
+        stats["rate"] = done / elapsed if elapsed > 0 else 0.0
     
     return updates
 
+def get_data_revision(schedule: bool = False) -> int:
+    """
+    Changes whenever parcel or event data shown to users changes (for HTTP
+    ETags); with schedule, also when a parcel's next_check_at or destination does.
+    """
+    with connection(DB_PATH) as conn:
+        return data_revision(conn, schedule)
+
+def latest_status_change_id() -> int:
+    with connection(DB_PATH) as conn:
+        return conn.execute('SELECT COALESCE(MAX(id), 0) FROM status_changes').fetchone()[0]
+
+def status_changes_since(last_id: int, limit: int = 100) -> List[Dict]:
+    """Status changes recorded by check_updates after change id last_id, oldest first."""
+    with connection(DB_PATH) as conn:
+        rows = conn.execute('''
+            SELECT id, tracking_number, status, state, last_event, last_update, created_at
+            FROM status_changes WHERE id > ? ORDER BY id LIMIT ?
+        ''', (last_id, limit)).fetchall()
+    return [
+        {"id": row[0], "tracking_number": row[1], "status": row[2], "state": row[3],
+         "last_event": row[4], "last_update": row[5], "created_at": row[6]}
+        for row in rows
+    ]
+
+def format_check_stats(stats: Dict) -> str:
+    """One-line summary of a check run (wall-clock time and throughput)."""
+    line = f"Checked {stats['parcels']} parcel(s) in {stats['elapsed']:.2f}s ({stats['rate']:.1f} parcels/sec)"
+    if stats.get("events"):
+        line += f", {stats['events']} new event(s) stored"
+    if stats.get("not_due"):
+        line += f", {stats['not_due']} not due or archived"
+    return line
+
+def pop_option(args: List[str], name: str, default: Optional[str] = None) -> Optional[str]:
+    """Remove `--name value` or `--name=value` from args and return the value."""
+    for i, arg in enumerate(args):
+        if arg == name and i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+        if arg.startswith(name + "="):
+            del args[i]
+            return arg.split("=", 1)[1]
+    return default
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: parcel_tracker.py <command> [args]")
         print("")
         print("Commands:")
         print("  add <tracking_number> [alias]  Add a parcel to track (with optional alias)")
+        print("  import <file> [--format F]     Add parcels from a CSV/JSON/JSONL file (- = stdin)")
+        print("  export [--format jsonl|csv]    Export parcels and their events (see export --help)")
         print("  remove <tracking_number>       Remove a parcel")
-        print("  list                           List all tracked parcels")
-        print("  check                          Check for updates")
+        print("  list [--active]                List tracked parcels (--active hides archived)")
+        print("  check [--workers N] [--all]    Check due parcels for updates (--all: every parcel)")
+        print("  unarchive <tracking_number>    Resume checking an archived parcel")
         print("  detect <tracking_number>       Detect carrier from tracking number")
         print("")
         sys.exit(1)
@@ -712,6 +1419,89 @@ def main():
         print(msg)
         sys.exit(0 if success else 1)
     
+    elif command == "import":
+        args = sys.argv[2:]
+        fmt = pop_option(args, "--format")
+        batch_size = int(pop_option(args, "--batch", str(IMPORT_BATCH_SIZE)))
+        if not args:
+            print("Usage: parcel_tracker.py import <file> [--format csv|json|jsonl] [--batch N]")
+            print("CSV: tracking number, alias columns (or a header naming them); JSON: a list of")
+            print("numbers or {\"tracking_number\", \"alias\"} objects; JSONL: one of those per line")
+            sys.exit(1)
+        try:
+            report = import_parcels(args[0], fmt, batch_size)
+        except (ValueError, OSError) as e:
+            print(f"Cannot import {args[0]}: {e}", file=sys.stderr)
+            sys.exit(1)
+        start = time.monotonic()
+        added = duplicates = errors = 0
+        for entry in report:
+            if entry["added"]:
+                added += 1
+                continue
+            if entry.get("duplicate"):
+                duplicates += 1
+            else:
+                errors += 1
+            where = f"line {entry['line']}: " if "line" in entry else ""
+            print(f"{where}{entry['tracking_number'] or '-'}: {entry['error']}")
+        print(f"Imported {added} parcel(s) in {time.monotonic() - start:.2f}s, "
+              f"{duplicates} duplicate(s), {errors} error(s)")
+        sys.exit(1 if errors else 0)
+    
+    elif command == "export":
+        args = sys.argv[2:]
+        if "--help" in args:
+            print("Usage: parcel_tracker.py export [--format jsonl|csv] [--output FILE]")
+            print("         [--carrier C] [--status S] [--from DATE] [--to DATE]")
+            print("         [--after-event N | --watermark-file FILE]")
+            print("Dates filter on when parcels were added. --after-event exports only events")
+            print("stored after that watermark; --watermark-file reads it and saves the new one.")
+            sys.exit(0)
+        fmt = pop_option(args, "--format", "jsonl")
+        output = pop_option(args, "--output")
+        status = pop_option(args, "--status")
+        after_event = pop_option(args, "--after-event")
+        watermark_file = pop_option(args, "--watermark-file")
+        if status and status not in STATUS_CATEGORIES:
+            print(f"Unknown status {status!r}, expected one of {', '.join(STATUS_CATEGORIES)}", file=sys.stderr)
+            sys.exit(1)
+        if watermark_file and after_event is None and os.path.exists(watermark_file):
+            with open(watermark_file) as f:
+                after_event = f.read().strip() or None
+        try:
+            watermark, parcels = iter_export(
+                carrier=pop_option(args, "--carrier"), state=status,
+                date_from=pop_option(args, "--from"), date_to=pop_option(args, "--to"),
+                after_event=after_event,
+            )
+            lines = export_lines(parcels, fmt, header=False)
+        except ValueError as e:
+            print(f"Cannot export: {e}", file=sys.stderr)
+            sys.exit(1)
+        
+        written = 0
+        out = open(output, "w", newline="", encoding="utf-8") if output else sys.stdout
+        try:
+            out.write(export_header(fmt))
+            for line in lines:
+                out.write(line)
+                written += 1
+        except BrokenPipeError:
+            # Reader went away (e.g. `| head`): the export is incomplete, keep the old watermark
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+        finally:
+            if output:
+                out.close()
+        if watermark_file:
+            with open(watermark_file + ".tmp", "w") as f:
+                f.write(f"{watermark}\n")
+            os.replace(watermark_file + ".tmp", watermark_file)
+        unit = "parcel(s)" if fmt == "jsonl" else "row(s)"
+        print(f"Exported {written} {unit} to {output or 'stdout'}; watermark {watermark}", file=sys.stderr)
+        sys.exit(0)
+    
     elif command == "remove":
         if len(sys.argv) < 3:
             print("Usage: parcel_tracker.py remove <tracking_number>")
@@ -721,7 +1511,7 @@ def main():
         sys.exit(0 if success else 1)
     
     elif command == "list":
-        parcels = list_parcels()
+        parcels = list_parcels(include_archived="--active" not in sys.argv[2:])
         if not parcels:
             print("No parcels being tracked")
         else:
@@ -729,14 +1519,22 @@ def main():
             print("-" * 110)
             for p in parcels:
                 carrier = get_carrier_display_name(p["carrier"]) if p["carrier"] else "Unknown"
-                status = (p["status"] or "Pending")[:26]
+                status = (("🗄 " if p["archived"] else "") + (p["status"] or "Pending"))[:26]
                 last = p["last_update"] or "Never"
                 alias = (p["alias"] or "")[:18]
                 print(f"{p['tracking_number']:<22} {alias:<20} {carrier:<18} {status:<28} {last}")
         sys.exit(0)
     
     elif command == "check":
-        updates = check_updates()
+        args = sys.argv[2:]
+        workers = pop_option(args, "--workers", str(DEFAULT_WORKERS))
+        if not workers.isdecimal() or int(workers) < 1:
+            print("Usage: parcel_tracker.py check [--workers N] [--all]")
+            print(f"--workers takes a number of parallel fetches (1 or more), got {workers!r}")
+            sys.exit(1)
+        workers = int(workers)
+        stats = {}
+        updates = check_updates(workers=workers, stats=stats, due_only="--all" not in args)
         if updates:
             print(f"Found {len(updates)} update(s):")
             for u in updates:
@@ -749,25 +1547,45 @@ def main():
                 print(f"   Time: {u['event'].get('date')}")
         else:
             print("No new updates")
+        print(format_check_stats(stats))
+        print(HTTP_POOL.summary())
+        print(RESPONSE_CACHE.summary())
         sys.exit(0)
     
+    elif command == "unarchive":
+        if len(sys.argv) < 3:
+            print("Usage: parcel_tracker.py unarchive <tracking_number>")
+            sys.exit(1)
+        success, msg = unarchive_parcel(sys.argv[2])
+        print(msg)
+        sys.exit(0 if success else 1)
+    
     elif command == "detect":
         if len(sys.argv) < 3:
             print("Usage: parcel_tracker.py detect <tracking_number>")
             sys.exit(1)
-        carrier = detect_carrier(sys.argv[2])
+        candidates = detect_carriers(sys.argv[2])
+        carrier = candidates[0] if candidates else None
         if carrier:
             print(f"Detected carrier: {get_carrier_display_name(carrier)} ({carrier})")
+            if len(candidates) > 1:
+                print(f"Also matches: {', '.join(candidates[1:])}")
         else:
             print("Could not detect carrier from tracking number pattern")
             print("Will try universal tracking APIs when checking")
+        learned = BACKEND_STATS.preferred(number_shape(sys.argv[2]))
+        if learned:
+            print(f"Learned backend for {number_shape(sys.argv[2])} numbers: {learned}")
         sys.exit(0)
     
     elif command == "track":
-        if len(sys.argv) < 3:
-            print("Usage: parcel_tracker.py track <tracking_number>")
+        args = sys.argv[2:]
+        fresh = "--fresh" in args
+        args = [a for a in args if a != "--fresh"]
+        if not args:
+            print("Usage: parcel_tracker.py track <tracking_number> [--fresh]")
             sys.exit(1)
-        result = track_parcel(sys.argv[2])
+        result = track_parcel(args[0], use_cache=not fresh)
         if result:
             print(json.dumps(result, indent=2, ensure_ascii=False))
         else:
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Per-carrier rate limiting for parcel-tracker.
+Token buckets, daily quotas and backoff state live in the SQLite database,
+so separate cron runs (and the web app) share the same budget.
+Uses only standard library (no external dependencies).
+"""
+
+import sys
+import random
+import sqlite3
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Tuple
+
+from db import connection, transaction
+
+# key -> (requests per second, burst size, daily quota or None)
+DEFAULT_LIMITS: Dict[str, Tuple[float, int, Optional[int]]] = {
+    "colissimo": (2.0, 5, None),
+    "chronopost": (2.0, 5, None),
+    "cainiao": (5.0, 10, None),
+    "yanwen": (1.0, 2, None),
+    "gls": (2.0, 5, None),
+    "dpd": (2.0, 5, None),
+    # Free tiers: 100 requests/day
+    "tracktry": (1.0, 2, 100),
+    "17track": (1.0, 2, 100),
+}
+FALLBACK_LIMIT = (1.0, 3, None)
+
+# Exponential backoff after 429/503 when no Retry-After is given
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 600.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter keyed by carrier, persisted in SQLite.
+    Each acquire() is a short IMMEDIATE transaction on a pooled connection
+    (db.transaction), so concurrent threads and processes see a consistent
+    bucket. Errors on the state table fail open: a locked database must
+    never stop tracking altogether.
+    """
+
+    def __init__(self, db_path: str, limits: Optional[Dict[str, Tuple[float, int, Optional[int]]]] = None,
+                 max_wait: float = 60.0):
+        self.db_path = db_path
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self.max_wait = max_wait
+        self._failing = set()
+
+    def _load(self, conn: sqlite3.Connection, key: str, now: float) -> list:
+        row = conn.execute(
+            'SELECT tokens, updated_at, blocked_until, failures, quota_day, quota_used FROM rate_limits WHERE key = ?',
+            (key,)
+        ).fetchone()
+        rate, burst, _ = self.limits.get(key, FALLBACK_LIMIT)
+        if row is None:
+            return [float(burst), now, 0.0, 0, None, 0]
+        tokens, updated_at, blocked_until, failures, quota_day, quota_used = row
+        tokens = min(float(burst), tokens + max(0.0, now - updated_at) * rate)
+        return [tokens, now, blocked_until or 0.0, failures or 0, quota_day, quota_used or 0]
+
+    def _store(self, conn: sqlite3.Connection, key: str, state: list):
+        conn.execute('''
+            INSERT OR REPLACE INTO rate_limits (key, tokens, updated_at, blocked_until, failures, quota_day, quota_used)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (key, *state))
+
+    def acquire(self, key: str, cost: int = 1) -> bool:
+        """
+        Take `cost` tokens for `key`, sleeping until they are available.
+        Returns False when the daily quota is spent or the wait would exceed max_wait.
+        """
+        rate, burst, daily = self.limits.get(key, FALLBACK_LIMIT)
+        deadline = time.monotonic() + self.max_wait
+
+        while True:
+            now = time.time()
+            today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+            try:
+                with transaction(self.db_path, immediate=True) as conn:
+                    state = self._load(conn, key, now)
+                    tokens, _, blocked_until, _, quota_day, quota_used = state
+                    if quota_day != today:
+                        state[4], state[5] = today, 0
+                        quota_used = 0
+
+                    needed = min(float(cost), float(burst))
+                    granted, wait = False, None
+                    if daily is not None and quota_used + cost > daily:
+                        pass
+                    elif now < blocked_until:
+                        wait = blocked_until - now
+                    elif tokens >= needed:
+                        state[0] = tokens - needed
+                        state[5] = quota_used + cost
+                        granted = True
+                    else:
+                        wait = (needed - tokens) / rate
+                    self._store(conn, key, state)
+                if granted or wait is None:
+                    return granted
+            except sqlite3.Error as e:
+                print(f"Rate limiter error ({key}): {e}", file=sys.stderr)
+                return True
+
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def backoff(self, key: str, retry_after: Optional[str] = None) -> float:
+        """
+        Record a throttling response (429/503) for `key`.
+        Honors Retry-After when present, otherwise exponential backoff with jitter.
+        Returns the delay in seconds.
+        """
+        now = time.time()
+        self._failing.add(key)
+        try:
+            with transaction(self.db_path, immediate=True) as conn:
+                state = self._load(conn, key, now)
+                state[3] += 1
+                delay = parse_retry_after(retry_after)
+                if delay is None:
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** (state[3] - 1)))
+                    delay *= random.uniform(0.5, 1.5)
+                state[0] = 0.0
+                state[2] = max(state[2], now + delay)
+                self._store(conn, key, state)
+        except sqlite3.Error as e:
+            print(f"Rate limiter error ({key}): {e}", file=sys.stderr)
+            delay = BACKOFF_BASE
+        return delay
+
+    def record_success(self, key: str):
+        """Reset the backoff level for `key` after a successful response."""
+        if key not in self._failing:
+            return
+        self._failing.discard(key)
+        try:
+            with transaction(self.db_path) as conn:
+                conn.execute('UPDATE rate_limits SET failures = 0 WHERE key = ?', (key,))
+        except sqlite3.Error as e:
+            print(f"Rate limiter error ({key}): {e}", file=sys.stderr)
+
+    def quota_remaining(self, key: str) -> Optional[int]:
+        """Requests left today for a quota-limited key (None if unlimited)."""
+        daily = self.limits.get(key, FALLBACK_LIMIT)[2]
+        if daily is None:
+            return None
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        try:
+            with connection(self.db_path) as conn:
+                row = conn.execute(
+                    'SELECT quota_day, quota_used FROM rate_limits WHERE key = ?', (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            return daily
+        if not row or row[0] != today:
+            return daily
+        return max(0, daily - row[1])
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tracking response cache for parcel-tracker.
+Normalized track_parcel() results are kept per tracking number with a
+per-carrier TTL: in memory (LRU) and optionally in the SQLite database,
+so the web app can reuse what the last cron check fetched.
+Uses only standard library (no external dependencies).
+"""
+
+import sys
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict
+
+from db import connection, transaction
+
+# Seconds a tracking result stays fresh, per carrier
+DEFAULT_TTLS = {
+    "cainiao": 900,
+    "yanwen": 1800,
+    "colissimo": 600,
+    "chronopost": 600,
+    "gls": 600,
+    "dpd": 600,
+}
+DEFAULT_TTL = 600
+
+
+class ResponseCache:
+    """
+    LRU cache of tracking results keyed by tracking number.
+    With a db_path, entries are also written to a `response_cache` table
+    (through the db.py pool) and looked up there on a memory miss (shared
+    across processes).
+    """
+
+    def __init__(self, capacity: int = 2048, db_path: Optional[str] = None,
+                 ttls: Optional[Dict[str, int]] = None, default_ttl: int = DEFAULT_TTL):
+        self.capacity = capacity
+        self.db_path = db_path
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "db_hits": 0, "misses": 0, "expired": 0}
+
+    def ttl_for(self, carrier: Optional[str]) -> int:
+        return self.ttls.get(carrier or "", self.default_ttl)
+
+    def _remember(self, tracking_number: str, entry: tuple):
+        with self._lock:
+            self._entries[tracking_number] = entry
+            self._entries.move_to_end(tracking_number)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, tracking_number: str, max_age: Optional[float] = None) -> Optional[Dict]:
+        """
+        Return a fresh cached result or None.
+        max_age overrides the carrier TTL (0 forces a miss).
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(tracking_number)
+            if entry is not None:
+                self._entries.move_to_end(tracking_number)
+
+        source = "hits"
+        if entry is None and self.db_path:
+            try:
+                with connection(self.db_path) as conn:
+                    row = conn.execute(
+                        'SELECT carrier, result, fetched_at FROM response_cache WHERE tracking_number = ?',
+                        (tracking_number,)
+                    ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Response cache error: {e}", file=sys.stderr)
+                row = None
+            if row:
+                entry = (row[0], json.loads(row[1]), row[2])
+                self._remember(tracking_number, entry)
+                source = "db_hits"
+
+        if entry is None:
+            self._count("misses")
+            return None
+
+        carrier, result, fetched_at = entry
+        limit = self.ttl_for(carrier) if max_age is None else max_age
+        if now - fetched_at >= limit:
+            self._count("expired")
+            return None
+
+        self._count(source)
+        return dict(result, cached_at=fetched_at)
+
+    def put(self, tracking_number: str, result: Dict):
+        """Store a normalized tracking result."""
+        carrier = result.get("carrier_detected") or result.get("carrier")
+        fetched_at = time.time()
+        result = {k: v for k, v in result.items() if k != "cached_at"}
+        self._remember(tracking_number, (carrier, result, fetched_at))
+        if self.db_path:
+            try:
+                with transaction(self.db_path) as conn:
+                    conn.execute('''
+                        INSERT OR REPLACE INTO response_cache (tracking_number, carrier, result, fetched_at)
+                        VALUES (?, ?, ?, ?)
+                    ''', (tracking_number, carrier, json.dumps(result, ensure_ascii=False), fetched_at))
+            except sqlite3.Error as e:
+                print(f"Response cache error: {e}", file=sys.stderr)
+
+    def invalidate(self, tracking_number: str):
+        """Drop a tracking number from memory and the database."""
+        with self._lock:
+            self._entries.pop(tracking_number, None)
+        if self.db_path:
+            try:
+                with transaction(self.db_path) as conn:
+                    conn.execute('DELETE FROM response_cache WHERE tracking_number = ?', (tracking_number,))
+            except sqlite3.Error as e:
+                print(f"Response cache error: {e}", file=sys.stderr)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["db_hits"] + stats["misses"] + stats["expired"]
+        stats["hit_ratio"] = (stats["hits"] + stats["db_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def summary(self) -> str:
+        """One-line summary of cache hit/miss counters."""
+        s = self.stats()
+        return (f"Cache: {s['hits'] + s['db_hits']} hit(s), {s['misses']} miss(es), "
+                f"{s['expired']} expired ({s['hit_ratio']:.0%} hit ratio)")
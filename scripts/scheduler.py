@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Status-aware polling schedule for parcel-tracker.
+Decides when each parcel is worth checking again, based on its current
+status, how long ago its last event happened and how often its carrier
+usually publishes scans. Delivered and stale parcels are archived.
+Uses only standard library (no external dependencies).
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+# Base re-check interval per status category (hours)
+CHECK_INTERVALS = {
+    "pending": 6,
+    "in_transit": 4,
+    "out_for_delivery": 1,
+    "exception": 2,
+}
+
+# Carriers whose scans are sparse (long international legs) are checked less often
+CARRIER_CADENCE = {
+    "cainiao": 2.0,
+    "yanwen": 2.0,
+    "sunyou": 2.0,
+    "4px": 2.0,
+}
+
+MAX_INTERVAL_HOURS = 48
+STALE_AFTER_DAYS = 30
+
+# DB timestamps use SQLite's CURRENT_TIMESTAMP format (UTC)
+DB_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Every value status_category() can return
+STATUS_CATEGORIES = ("pending", "in_transit", "out_for_delivery", "delivered", "exception")
+
+# Checked in order, as whole words: failed and negated deliveries ("not
+# delivered", "non distribué") come before "delivered", which they contain
+_STATUS_KEYWORDS = (
+    ("exception", (
+        r"exception", r"errors?", r"failed", r"failure", r"returned", r"undeliverable", r"undelivered",
+        r"not delivered", r"attempted", r"[ée]chec", r"retour\w*", r"non distribu[ée]e?",
+        r"pas pu [êe]tre (?:distribu|livr)[ée]e?",
+    )),
+    ("delivered", (r"delivered", r"livr[ée]e?s?", r"distribu[ée]e?s?")),
+    ("out_for_delivery", (r"delivering", r"distribution", r"out for delivery", r"en cours de livraison")),
+    ("in_transit", (r"transit\w*", r"inbound", r"outbound", r"acheminement", r"departed", r"arrived", r"customs")),
+    ("pending", (r"pending", r"added")),
+)
+_STATUS_PATTERNS = [
+    (category, re.compile(r"\b(?:" + "|".join(keywords) + r")\b"))
+    for category, keywords in _STATUS_KEYWORDS
+]
+
+
+def status_category(status: Optional[str]) -> str:
+    """
+    Map a free-text carrier status to one of: pending, in_transit,
+    out_for_delivery, delivered, exception.
+    """
+    if not status:
+        return "pending"
+    status_lower = status.lower()
+    for category, pattern in _STATUS_PATTERNS:
+        if pattern.search(status_lower):
+            return category
+    return "in_transit"
+
+
+def db_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def format_db_time(dt: datetime) -> str:
+    return dt.strftime(DB_TIME_FORMAT)
+
+
+def parse_event_time(value) -> Optional[datetime]:
+    """Best-effort parse of a carrier event date into naive UTC."""
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        if value > 1000000000000:
+            value = value / 1000
+        return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+    text = str(value).strip().replace("Z", "+00:00")
+    text = re.sub(r"\.\d+", "", text)
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def next_check(state: str, carrier: Optional[str], last_event_at: Optional[datetime],
+               now: Optional[datetime] = None) -> Tuple[Optional[datetime], bool]:
+    """
+    Return (next_check_at, archive).
+    Delivered parcels and parcels without an event for STALE_AFTER_DAYS
+    are archived (next_check_at None).
+    """
+    now = now or db_now()
+    if state == "delivered":
+        return None, True
+
+    idle = (now - last_event_at) if last_event_at else timedelta(0)
+    if idle > timedelta(days=STALE_AFTER_DAYS):
+        return None, True
+
+    hours = CHECK_INTERVALS.get(state, CHECK_INTERVALS["in_transit"])
+    hours *= CARRIER_CADENCE.get(carrier or "", 1.0)
+    # The longer a parcel has been quiet, the less likely it moves in the next hours
+    if idle > timedelta(days=7):
+        hours *= 4
+    elif idle > timedelta(days=3):
+        hours *= 2
+    return now + timedelta(hours=min(hours, MAX_INTERVAL_HOURS)), False
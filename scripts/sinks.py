@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Notification sinks for parcel-tracker.
+A sink delivers a batch of queued updates (see outbox.py) somewhere:
+OpenClaw messaging, an HTTP webhook, a local Unix socket or a JSON Lines
+file. Which sinks an update is queued for is decided by routing rules
+matching its parcel, carrier or status, read from a JSON config file:
+
+  {
+    "sinks": {
+      "phone": {"type": "openclaw"},
+      "hook":  {"type": "webhook", "url": "http://127.0.0.1:8099/updates", "batch_size": 200},
+      "local": {"type": "socket", "path": "/run/parcel-updates.sock"},
+      "log":   {"type": "file", "path": "~/parcel-updates.jsonl"}
+    },
+    "routes": [
+      {"status": ["delivered", "exception"], "sinks": ["phone", "log"]},
+      {"carrier": "cainiao", "sinks": ["hook"]},
+      {"sinks": ["log"]}
+    ]
+  }
+
+The first route whose conditions all match wins (a route without
+conditions matches everything); an update no route matches is only
+marked as seen (so {"sinks": {}} turns notifications off). Without a
+config file every update goes to OpenClaw.
+Uses only standard library (no external dependencies).
+"""
+
+import json
+import os
+import socket
+import subprocess
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from db import DB_PATH
+from http_client import HTTPPool
+from scheduler import STATUS_CATEGORIES, status_category
+
+# Routing config (JSON, format above)
+NOTIFY_CONFIG = os.environ.get("PARCEL_NOTIFY_CONFIG",
+                               os.path.join(os.path.dirname(DB_PATH), "notify.json"))
+SEND_TIMEOUT = 30
+
+# Keep-alive connections shared by the webhook sinks
+WEBHOOK_POOL = HTTPPool(max_idle_per_host=4)
+
+# Sink every update goes to without a config file
+DEFAULT_SINK = "openclaw"
+
+# Update fields a route can match on ("status" matches the status category)
+ROUTE_KEYS = ("tracking_number", "carrier", "status")
+
+
+def format_message(updates: List[Dict]) -> str:
+    """One chat message: details for a single update, a summary for several."""
+    if len(updates) == 1:
+        u = updates[0]
+        alias_str = f" [{u['alias']}]" if u.get("alias") else ""
+        message = "📦 Parcel Update\n\n"
+        message += f"{u['tracking_number']}{alias_str}\n"
+        message += f"Carrier: {u['carrier_name']}\n"
+        message += f"Status: {u['status']}\n"
+        if u["event"].get("description"):
+            message += f"Event: {u['event']['description']}\n"
+        if u["event"].get("location"):
+            message += f"Location: {u['event']['location']}\n"
+        if u["event"].get("date"):
+            message += f"Time: {u['event']['date']}"
+        return message
+
+    lines = [f"📦 {len(updates)} Parcel Updates\n"]
+    for u in updates:
+        alias_str = f" [{u['alias']}]" if u.get("alias") else ""
+        lines.append(f"• {u['tracking_number']}{alias_str} ({u['carrier_name']}): {u['status']}")
+    return "\n".join(lines) + "\n"
+
+
+def _json_lines(updates: List[Dict]) -> bytes:
+    return "".join(json.dumps(u, ensure_ascii=False, separators=(",", ":")) + "\n"
+                   for u in updates).encode("utf-8")
+
+
+class Sink:
+    """
+    Delivers batches of updates. send() raises on failure (the batch is
+    then retried by the outbox); it may be called from several threads.
+    """
+
+    kind = "sink"
+    # Most updates per send() call
+    batch_size = 50
+
+    def send(self, updates: List[Dict]):
+        raise NotImplementedError
+
+    def close(self):
+        """Release connections or files held between sends."""
+
+    def __repr__(self):
+        return f"<{self.kind} sink>"
+
+
+class OpenClawSink(Sink):
+    """One `openclaw message send` per batch (a chat message summarizing it)."""
+
+    kind = "openclaw"
+
+    def __init__(self, batch_size: int = 50, timeout: float = SEND_TIMEOUT):
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    def send(self, updates: List[Dict]):
+        try:
+            result = subprocess.run(
+                ["openclaw", "message", "send", "--message", format_message(updates)],
+                capture_output=True,
+                text=True,
+                timeout=self.timeout
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise RuntimeError(f"openclaw: {e}") from e
+        if result.returncode != 0:
+            raise RuntimeError(f"openclaw exited with {result.returncode}: {result.stderr.strip()[:200]}")
+
+
+class WebhookSink(Sink):
+    """
+    POSTs {"updates": [...]} as JSON to a URL over a pooled keep-alive
+    connection; any 2xx status is a success.
+    """
+
+    kind = "webhook"
+
+    def __init__(self, url: str, batch_size: int = 200, timeout: float = 10,
+                 headers: Optional[Dict[str, str]] = None):
+        if not url.startswith(("http://", "https://")):
+            raise ValueError(f"webhook url must be http(s): {url!r}")
+        self.url = url
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.headers = dict(headers or {}, **{"Content-Type": "application/json"})
+
+    def send(self, updates: List[Dict]):
+        body = json.dumps({"updates": updates}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        status, _, data = WEBHOOK_POOL.request("POST", self.url, headers=self.headers, body=body,
+                                               timeout=self.timeout, max_redirects=0)
+        if not 200 <= status < 300:
+            raise RuntimeError(f"webhook answered {status}: {data[:200].decode('utf-8', 'replace')}")
+
+    def __repr__(self):
+        return f"<webhook sink {self.url}>"
+
+
+class UnixSocketSink(Sink):
+    """
+    Writes each batch as JSON Lines to a Unix stream socket (one
+    connection per batch, closed after writing) for a local consumer.
+    """
+
+    kind = "socket"
+
+    def __init__(self, path: str, batch_size: int = 200, timeout: float = 10):
+        self.path = os.path.expanduser(path)
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    def send(self, updates: List[Dict]):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            sock.sendall(_json_lines(updates))
+            sock.shutdown(socket.SHUT_WR)
+
+    def __repr__(self):
+        return f"<socket sink {self.path}>"
+
+
+class FileSink(Sink):
+    """Appends updates to a JSON Lines file, one line per update."""
+
+    kind = "file"
+
+    def __init__(self, path: str, batch_size: int = 500, fsync: bool = False):
+        self.path = os.path.expanduser(path)
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+    def send(self, updates: List[Dict]):
+        data = _json_lines(updates)
+        with self._lock, open(self.path, "ab") as f:
+            f.write(data)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def __repr__(self):
+        return f"<file sink {self.path}>"
+
+
+SINK_TYPES = {
+    "openclaw": OpenClawSink,
+    "webhook": WebhookSink,
+    "socket": UnixSocketSink,
+    "file": FileSink,
+}
+
+
+def make_sink(spec: Dict) -> Sink:
+    """Sink from a config entry: {"type": ..., **constructor arguments}."""
+    options = dict(spec)
+    kind = options.pop("type", None)
+    if kind not in SINK_TYPES:
+        raise ValueError(f"unknown sink type {kind!r} (expected one of {', '.join(SINK_TYPES)})")
+    try:
+        return SINK_TYPES[kind](**options)
+    except TypeError as e:
+        raise ValueError(f"{kind} sink: {e}") from e
+
+
+class Routing:
+    """Named sinks plus the rules choosing them for an update."""
+
+    def __init__(self, sinks: Dict[str, Sink], routes: List[Dict]):
+        for route in routes:
+            unknown = [name for name in route.get("sinks", []) if name not in sinks]
+            if unknown:
+                raise ValueError(f"route {route!r} names unknown sink(s): {', '.join(unknown)}")
+            bad = [key for key in route if key not in ROUTE_KEYS + ("sinks",)]
+            if bad:
+                raise ValueError(f"route {route!r}: unknown condition(s) {', '.join(bad)}")
+            statuses = route.get("status", [])
+            bad = [v for v in ([statuses] if isinstance(statuses, str) else statuses) if v not in STATUS_CATEGORIES]
+            if bad:
+                raise ValueError(f"route {route!r}: unknown status(es) {', '.join(bad)} "
+                                 f"(expected {', '.join(STATUS_CATEGORIES)})")
+        self.sinks = sinks
+        self.routes = [
+            ({key: {v.lower() for v in ([value] if isinstance(value, str) else value)}
+              for key, value in route.items() if key != "sinks"}, list(route.get("sinks", [])))
+            for route in routes
+        ]
+
+    def recipients(self, update: Dict) -> List[str]:
+        """Names of the sinks the update goes to (first matching route)."""
+        values = {
+            "tracking_number": (update.get("tracking_number") or "").lower(),
+            "carrier": (update.get("carrier") or "").lower(),
+            "status": status_category(update.get("status")),
+        }
+        for conditions, names in self.routes:
+            if all(values[key] in allowed for key, allowed in conditions.items()):
+                return names
+        return []
+
+    def close(self):
+        for sink in self.sinks.values():
+            sink.close()
+
+
+def load_routing(path: str = NOTIFY_CONFIG) -> Routing:
+    """Routing from a config file (ValueError if invalid), or the default without one."""
+    if not os.path.exists(path):
+        return Routing({DEFAULT_SINK: OpenClawSink()}, [{"sinks": [DEFAULT_SINK]}])
+    try:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path}: invalid JSON: {e}") from e
+    sinks = {}
+    for name, spec in (config.get("sinks") or {}).items():
+        try:
+            sinks[name] = make_sink(spec)
+        except ValueError as e:
+            raise ValueError(f"{path}: sink {name!r}: {e}") from e
+    try:
+        return Routing(sinks, config.get("routes") or [{"sinks": list(sinks)}])
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from e
+
+
+_routing: Optional[Routing] = None
+_routing_lock = threading.Lock()
+
+
+def get_routing() -> Routing:
+    """The routing loaded from NOTIFY_CONFIG (loaded once)."""
+    global _routing
+    with _routing_lock:
+        if _routing is None:
+            _routing = load_routing()
+        return _routing
+
+
+def reload_routing() -> Tuple[Routing, Optional[str]]:
+    """
+    Re-read NOTIFY_CONFIG. Returns (routing, error): an invalid file keeps
+    the routing in use and returns the error.
+    """
+    global _routing
+    try:
+        routing = load_routing()
+    except (OSError, ValueError) as e:
+        return get_routing(), str(e)
+    with _routing_lock:
+        old, _routing = _routing, routing
+    if old is not None:
+        old.close()
+    return routing, None
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Tiny compiled template engine for the web UI.
+A template is parsed once into Python source and compiled to a generator
+function yielding the page in pieces (each run of text and values is one
+piece), so a page can be joined into a string or streamed as it renders:
+rows produced by a database cursor are sent without building the list.
+
+Syntax:
+  {{ name }}  {{ p.alias }}        value, HTML-escaped (None renders empty)
+  {{ value|url }}                  URL-quoted (which also makes it HTML-safe)
+  {{ value|raw }}                  inserted as is (trusted HTML only)
+  {% for p in parcels %}...{% endfor %}
+  {% if name %}...{% elif not other %}...{% else %}...{% endif %}
+
+Names are looked up in the render context, attributes in dicts (or
+objects); there are no other expressions, views prepare their values.
+Uses only standard library (no external dependencies).
+"""
+
+import html
+import re
+from urllib.parse import quote
+
+_TOKEN = re.compile(r"{{(.*?)}}|{%(.*?)%}", re.S)
+_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*$")
+_SPECIAL = re.compile(r"[&<>\"']").search
+_URL_SAFE = re.compile(r"[A-Za-z0-9_.~-]*").fullmatch
+
+
+class TemplateError(ValueError):
+    """Invalid template source."""
+
+
+def escape(value):
+    """HTML-escape a value for text and quoted attributes; None -> ''."""
+    if value is None:
+        return ""
+    if value.__class__ is not str:
+        value = str(value)
+    if value.isalnum() or not _SPECIAL(value):
+        return value
+    return html.escape(value)
+
+
+def url(value):
+    """Quote a value for use as one URL path segment or query value (HTML-safe)."""
+    if value is None:
+        return ""
+    if value.__class__ is not str:
+        value = str(value)
+    if value.isalnum() and value.isascii() or _URL_SAFE(value):
+        return value
+    return quote(value, safe="")
+
+
+def lookup(obj, attr):
+    """obj[attr] for mappings and rows, else getattr(obj, attr, None)."""
+    try:
+        return obj[attr]
+    except (TypeError, KeyError, IndexError):
+        return getattr(obj, attr, None)
+
+
+class Template:
+    """A template compiled once; render() returns a str, stream() yields its pieces."""
+
+    def __init__(self, source, name="<template>"):
+        self.name = name
+        self.code = self._compile(source)
+        namespace = {}
+        exec(compile(self.code, name, "exec"),
+             {"_escape": escape, "_url": url, "_lookup": lookup}, namespace)
+        self._render = namespace["_render"]
+
+    def render(self, **context):
+        return "".join(self._render(context))
+
+    def stream(self, **context):
+        """Generator of page pieces; iterables in the context are consumed lazily."""
+        return self._render(context)
+
+    def _compile(self, source):
+        lines = ["def _render(_ctx):", "    if False:", "        yield ''"]
+        depth = 1
+        stack = []  # open blocks: ("for", loop variable) / ("if", None)
+        loop_vars = set()
+        pending = []  # text (str) and expressions ((code,)) of the next yielded piece
+
+        def flush():
+            if len(pending) == 1 and not isinstance(pending[0], str):
+                lines.append("    " * depth + f"yield {pending[0][0]}")
+            elif pending:
+                # One f-string per piece; an expression used twice (e.g. a row's
+                # tracking number in two links) is computed once into a local
+                names = {}
+                parts = []
+                for part in pending:
+                    if isinstance(part, str):
+                        parts.append(part.replace("{", "{{").replace("}", "}}"))
+                        continue
+                    code = part[0]
+                    if code not in names:
+                        names[code] = f"_v{len(names)}"
+                        lines.append("    " * depth + f"{names[code]} = {code}")
+                    parts.append("{" + names[code] + "}")
+                lines.append("    " * depth + f"yield f{''.join(parts)!r}")
+            pending.clear()
+
+        def emit(line):
+            flush()
+            lines.append("    " * depth + line)
+
+        def expr(text):
+            text = text.strip()
+            negate = text.startswith("not ")
+            if negate:
+                text = text[4:].strip()
+            if not _NAME.match(text):
+                raise TemplateError(f"{self.name}: invalid expression {text!r}")
+            root, *attrs = text.split(".")
+            code = f"L_{root}" if root in loop_vars else f"_ctx.get({root!r})"
+            for attr in attrs:
+                code = f"_lookup({code}, {attr!r})"
+            return f"not {code}" if negate else code
+
+        pos = 0
+        for match in _TOKEN.finditer(source):
+            if match.start() > pos:
+                pending.append(source[pos:match.start()])
+            pos = match.end()
+
+            if match.group(1) is not None:
+                value, *filters = [part.strip() for part in match.group(1).split("|")]
+                code = expr(value)
+                escaped = True
+                for name in filters:
+                    if name == "raw":
+                        escaped = False
+                    elif name == "url":
+                        code = f"_url({code})"
+                        escaped = False  # quoted output has nothing to escape
+                    else:
+                        raise TemplateError(f"{self.name}: unknown filter {name!r}")
+                pending.append((f"_escape({code})" if escaped else code,))
+                continue
+
+            flush()
+            words = match.group(2).split()
+            tag = words[0] if words else ""
+            if tag == "for" and len(words) == 4 and words[2] == "in" and words[1].isidentifier():
+                emit(f"for L_{words[1]} in {expr(words[3])} or ():")
+                stack.append(("for", words[1]))
+                loop_vars.add(words[1])
+                depth += 1
+                emit("pass")
+            elif tag == "if" and len(words) > 1:
+                emit(f"if {expr(' '.join(words[1:]))}:")
+                stack.append(("if", None))
+                depth += 1
+                emit("pass")
+            elif tag in ("elif", "else") and stack and stack[-1][0] == "if":
+                depth -= 1
+                emit(f"elif {expr(' '.join(words[1:]))}:" if tag == "elif" else "else:")
+                depth += 1
+                emit("pass")
+            elif tag in ("endfor", "endif") and stack and stack[-1][0] == tag[3:]:
+                kind, var = stack.pop()
+                if kind == "for" and all(v != var for _, v in stack):
+                    loop_vars.discard(var)
+                depth -= 1
+            else:
+                raise TemplateError(f"{self.name}: unexpected {{% {match.group(2).strip()} %}}")
+
+        if stack:
+            raise TemplateError(f"{self.name}: unclosed {{% {stack[-1][0]} %}}")
+        if pos < len(source):
+            pending.append(source[pos:])
+        emit("pass")
+        return "\n".join(lines) + "\n"
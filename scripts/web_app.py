@@ -10,182 +10,205 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from parcel_tracker import (
     init_db, add_parcel, remove_parcel, list_parcels, 
-    check_updates, track_parcel, get_carrier_display_name, DB_PATH
+    check_updates, track_parcel, get_carrier_display_name, status_category, DB_PATH,
+    get_parcel_history, store_tracking_result, DEFAULT_WORKERS,
+    query_parcels, iter_parcels, count_parcels, get_parcel, add_parcels,
+    latest_status_change_id, status_changes_since, get_data_revision, iter_export
 )
-import sqlite3
+from exporter import export_lines, CONTENT_TYPES
+from daemon import CheckLoop, RunLock, LockHeld, CHECK_LOCK
+import gzip
+import hashlib
 import json
+import signal
+import threading
+import time
+import types
+import uuid
+import zlib
 from urllib.parse import parse_qs
+from templates import Template
+from sinks import get_routing
+
+# Dashboard stylesheet, served once as a cacheable static asset (/static/style.css)
+STYLE_CSS = """
+* { box-sizing: border-box; margin: 0; padding: 0; }
+body { 
+    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+    background: #f5f5f5;
+    color: #333;
+    line-height: 1.6;
+}
+.container { max-width: 900px; margin: 0 auto; padding: 20px; }
+header { 
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    color: white;
+    padding: 30px;
+    border-radius: 10px;
+    margin-bottom: 30px;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+}
+header h1 { margin-bottom: 10px; font-size: 2em; }
+header p { opacity: 0.9; }
+.card {
+    background: white;
+    border-radius: 10px;
+    padding: 25px;
+    margin-bottom: 20px;
+    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+}
+.card h2 { 
+    margin-bottom: 20px; 
+    color: #667eea;
+    font-size: 1.3em;
+    border-bottom: 2px solid #f0f0f0;
+    padding-bottom: 10px;
+}
+form { display: flex; gap: 10px; flex-wrap: wrap; align-items: end; }
+.form-group { flex: 1; min-width: 200px; }
+label { display: block; margin-bottom: 5px; font-weight: 500; color: #555; }
+input[type="text"] {
+    width: 100%;
+    padding: 12px;
+    border: 2px solid #e0e0e0;
+    border-radius: 6px;
+    font-size: 14px;
+    transition: border-color 0.3s;
+}
+input[type="text"]:focus {
+    outline: none;
+    border-color: #667eea;
+}
+button {
+    padding: 12px 24px;
+    background: #667eea;
+    color: white;
+    border: none;
+    border-radius: 6px;
+    cursor: pointer;
+    font-size: 14px;
+    font-weight: 500;
+    transition: all 0.3s;
+}
+button:hover { background: #5a6fd6; transform: translateY(-1px); }
+button.secondary { background: #48bb78; }
+button.secondary:hover { background: #38a169; }
+button.danger { background: #f56565; }
+button.danger:hover { background: #e53e3e; }
+.parcel-list { list-style: none; }
+.parcel-item {
+    display: flex;
+    justify-content: space-between;
+    align-items: center;
+    padding: 15px;
+    border-bottom: 1px solid #f0f0f0;
+    transition: background 0.2s;
+}
+.parcel-item:hover { background: #f9f9f9; }
+.parcel-item:last-child { border-bottom: none; }
+.parcel-info { flex: 1; }
+.parcel-alias {
+    font-weight: 600;
+    color: #667eea;
+    font-size: 1.1em;
+}
+.parcel-number { 
+    font-family: monospace; 
+    color: #666; 
+    font-size: 0.9em;
+    margin-top: 3px;
+}
+.parcel-carrier {
+    display: inline-block;
+    background: #edf2f7;
+    color: #4a5568;
+    padding: 3px 10px;
+    border-radius: 20px;
+    font-size: 0.85em;
+    margin-top: 5px;
+}
+.parcel-status {
+    display: inline-block;
+    padding: 5px 12px;
+    border-radius: 20px;
+    font-size: 0.85em;
+    font-weight: 500;
+    margin-right: 10px;
+}
+.status-delivered { background: #c6f6d5; color: #22543d; }
+.status-delivering { background: #bee3f8; color: #2a4365; }
+.status-transit { background: #fefcbf; color: #744210; }
+.status-pending { background: #e2e8f0; color: #2d3748; }
+.status-exception { background: #fed7d7; color: #742a2a; }
+.parcel-actions { display: flex; gap: 5px; }
+.parcel-actions button { padding: 8px 16px; font-size: 12px; }
+.empty-state {
+    text-align: center;
+    padding: 40px;
+    color: #718096;
+}
+.empty-state svg { 
+    width: 80px; 
+    height: 80px; 
+    margin-bottom: 20px;
+    opacity: 0.5;
+}
+.actions-bar {
+    display: flex;
+    gap: 10px;
+    margin-bottom: 20px;
+}
+.badge {
+    display: inline-block;
+    background: #667eea;
+    color: white;
+    padding: 2px 8px;
+    border-radius: 12px;
+    font-size: 0.75em;
+    margin-left: 5px;
+}
+.message {
+    padding: 12px 20px;
+    border-radius: 6px;
+    margin-bottom: 20px;
+}
+.message.success { background: #c6f6d5; color: #22543d; }
+.message.error { background: #fed7d7; color: #742a2a; }
+.event-list {
+    list-style: none;
+    margin-top: 15px;
+}
+.event-item {
+    padding: 10px;
+    border-left: 3px solid #667eea;
+    margin-bottom: 10px;
+    background: #f7fafc;
+    border-radius: 0 6px 6px 0;
+}
+.event-date { font-size: 0.85em; color: #718096; }
+.event-desc { font-weight: 500; }
+.event-location { font-size: 0.9em; color: #4a5568; }
+@media (max-width: 600px) {
+    .parcel-item { flex-direction: column; align-items: flex-start; }
+    .parcel-actions { margin-top: 10px; width: 100%; justify-content: flex-end; }
+}
+"""
+STYLE_VERSION = hashlib.sha1(STYLE_CSS.encode("utf-8")).hexdigest()[:16]
+STYLE_ETAG = f'"{STYLE_VERSION}"'
+# Versioned URL: browsers may cache it for a year, a CSS change gets a new URL
+STYLE_PATH = "/static/style.css"
+STYLE_URL = f"{STYLE_PATH}?v={STYLE_VERSION}"
 
 # Simple HTTP server with HTML generation
-def generate_html(title, content):
-    return f"""<!DOCTYPE html>
+# Pages are compiled templates (see templates.py), parsed once at import.
+# Values are HTML-escaped unless marked |raw; views prepare display values.
+LAYOUT_HEAD = """<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title} - Parcel Tracker</title>
-    <style>
-        * {{ box-sizing: border-box; margin: 0; padding: 0; }}
-        body {{ 
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: #f5f5f5;
-            color: #333;
-            line-height: 1.6;
-        }}
-        .container {{ max-width: 900px; margin: 0 auto; padding: 20px; }}
-        header {{ 
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 30px;
-            border-radius: 10px;
-            margin-bottom: 30px;
-            box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-        }}
-        header h1 {{ margin-bottom: 10px; font-size: 2em; }}
-        header p {{ opacity: 0.9; }}
-        .card {{
-            background: white;
-            border-radius: 10px;
-            padding: 25px;
-            margin-bottom: 20px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }}
-        .card h2 {{ 
-            margin-bottom: 20px; 
-            color: #667eea;
-            font-size: 1.3em;
-            border-bottom: 2px solid #f0f0f0;
-            padding-bottom: 10px;
-        }}
-        form {{ display: flex; gap: 10px; flex-wrap: wrap; align-items: end; }}
-        .form-group {{ flex: 1; min-width: 200px; }}
-        label {{ display: block; margin-bottom: 5px; font-weight: 500; color: #555; }}
-        input[type="text"] {{
-            width: 100%;
-            padding: 12px;
-            border: 2px solid #e0e0e0;
-            border-radius: 6px;
-            font-size: 14px;
-            transition: border-color 0.3s;
-        }}
-        input[type="text"]:focus {{
-            outline: none;
-            border-color: #667eea;
-        }}
-        button {{
-            padding: 12px 24px;
-            background: #667eea;
-            color: white;
-            border: none;
-            border-radius: 6px;
-            cursor: pointer;
-            font-size: 14px;
-            font-weight: 500;
-            transition: all 0.3s;
-        }}
-        button:hover {{ background: #5a6fd6; transform: translateY(-1px); }}
-        button.secondary {{ background: #48bb78; }}
-        button.secondary:hover {{ background: #38a169; }}
-        button.danger {{ background: #f56565; }}
-        button.danger:hover {{ background: #e53e3e; }}
-        .parcel-list {{ list-style: none; }}
-        .parcel-item {{
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            padding: 15px;
-            border-bottom: 1px solid #f0f0f0;
-            transition: background 0.2s;
-        }}
-        .parcel-item:hover {{ background: #f9f9f9; }}
-        .parcel-item:last-child {{ border-bottom: none; }}
-        .parcel-info {{ flex: 1; }}
-        .parcel-alias {{
-            font-weight: 600;
-            color: #667eea;
-            font-size: 1.1em;
-        }}
-        .parcel-number {{ 
-            font-family: monospace; 
-            color: #666; 
-            font-size: 0.9em;
-            margin-top: 3px;
-        }}
-        .parcel-carrier {{
-            display: inline-block;
-            background: #edf2f7;
-            color: #4a5568;
-            padding: 3px 10px;
-            border-radius: 20px;
-            font-size: 0.85em;
-            margin-top: 5px;
-        }}
-        .parcel-status {{
-            display: inline-block;
-            padding: 5px 12px;
-            border-radius: 20px;
-            font-size: 0.85em;
-            font-weight: 500;
-            margin-right: 10px;
-        }}
-        .status-delivered {{ background: #c6f6d5; color: #22543d; }}
-        .status-delivering {{ background: #bee3f8; color: #2a4365; }}
-        .status-transit {{ background: #fefcbf; color: #744210; }}
-        .status-pending {{ background: #e2e8f0; color: #2d3748; }}
-        .status-exception {{ background: #fed7d7; color: #742a2a; }}
-        .parcel-actions {{ display: flex; gap: 5px; }}
-        .parcel-actions button {{ padding: 8px 16px; font-size: 12px; }}
-        .empty-state {{
-            text-align: center;
-            padding: 40px;
-            color: #718096;
-        }}
-        .empty-state svg {{ 
-            width: 80px; 
-            height: 80px; 
-            margin-bottom: 20px;
-            opacity: 0.5;
-        }}
-        .actions-bar {{
-            display: flex;
-            gap: 10px;
-            margin-bottom: 20px;
-        }}
-        .badge {{
-            display: inline-block;
-            background: #667eea;
-            color: white;
-            padding: 2px 8px;
-            border-radius: 12px;
-            font-size: 0.75em;
-            margin-left: 5px;
-        }}
-        .message {{
-            padding: 12px 20px;
-            border-radius: 6px;
-            margin-bottom: 20px;
-        }}
-        .message.success {{ background: #c6f6d5; color: #22543d; }}
-        .message.error {{ background: #fed7d7; color: #742a2a; }}
-        .event-list {{
-            list-style: none;
-            margin-top: 15px;
-        }}
-        .event-item {{
-            padding: 10px;
-            border-left: 3px solid #667eea;
-            margin-bottom: 10px;
-            background: #f7fafc;
-            border-radius: 0 6px 6px 0;
-        }}
-        .event-date {{ font-size: 0.85em; color: #718096; }}
-        .event-desc {{ font-weight: 500; }}
-        .event-location {{ font-size: 0.9em; color: #4a5568; }}
-        @media (max-width: 600px) {{
-            .parcel-item {{ flex-direction: column; align-items: flex-start; }}
-            .parcel-actions {{ margin-top: 10px; width: 100%; justify-content: flex-end; }}
-        }}
-    </style>
+    <title>{{ title }} - Parcel Tracker</title>
+    <link rel="stylesheet" href="{{ style_url }}">
 </head>
 <body>
     <div class="container">
@@ -193,33 +216,286 @@ def generate_html(title, content):
             <h1>📦 Parcel Tracker</h1>
             <p>Universal parcel tracking with automatic carrier detection</p>
         </header>
-        {content}
+"""
+LAYOUT_FOOT = """
     </div>
 </body>
 </html>"""
 
+PAGE_TEMPLATE = Template(LAYOUT_HEAD + "        {{ content|raw }}" + LAYOUT_FOOT, "page")
+
+MESSAGE_TEMPLATE = Template("<div class='message {{ kind }}'>{{ text }}</div>", "message")
+
+def generate_html(title, content):
+    return PAGE_TEMPLATE.render(title=title, style_url=STYLE_URL, content=content)
+
+def message_html(text, success=False):
+    """A success/error banner; text is escaped (it may echo user input)."""
+    return MESSAGE_TEMPLATE.render(kind="success" if success else "error", text=text)
+
+STATUS_CLASSES = {
+    "delivered": "status-delivered",
+    "out_for_delivery": "status-delivering",
+    "in_transit": "status-transit",
+    "exception": "status-exception",
+    "pending": "status-pending",
+}
+
 def get_status_class(status):
     """Get CSS class based on status."""
-    if not status:
-        return "status-pending"
-    status_lower = status.lower()
-    if "delivered" in status_lower:
-        return "status-delivered"
-    elif "delivering" in status_lower or "distribution" in status_lower:
-        return "status-delivering"
-    elif "transit" in status_lower or "inbound" in status_lower or "outbound" in status_lower:
-        return "status-transit"
-    elif "exception" in status_lower or "error" in status_lower or "failed" in status_lower:
-        return "status-exception"
-    return "status-pending"
+    return STATUS_CLASSES[status_category(status)]
+
+class CheckJob:
+    """A check_updates() run in a background thread, with its progress."""
+    
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.state = "running"
+        self.done = 0
+        self.total = 0
+        self.updates = []
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+    
+    def progress(self, done, total, updates):
+        with self._lock:
+            changed = len(updates) > len(self.updates)
+            self.done, self.total = done, total
+            self.updates = [
+                {"tracking_number": u["tracking_number"], "alias": u["alias"], "status": u["status"]}
+                for u in updates
+            ]
+        if changed:
+            # Wake /events streams now instead of at their next poll
+            with STATUS_CHANGED:
+                STATUS_CHANGED.notify_all()
+    
+    def run(self):
+        # The embedded loop holds the run lock for this process; otherwise take it
+        # so a daemon or cron checker elsewhere is not polled alongside
+        lock = None if CHECK_LOOP else RunLock()
+        try:
+            if lock:
+                lock.acquire()
+            try:
+                # Waits for a check of the embedded loop instead of polling alongside it
+                with CHECK_LOCK:
+                    check_updates(workers=DEFAULT_WORKERS, progress=self.progress)
+            finally:
+                if lock:
+                    lock.release()
+            state = "done"
+        except LockHeld as e:
+            state, self.error = "skipped", str(e)
+        except Exception as e:
+            print(f"Background check failed: {e}", file=sys.stderr)
+            state, self.error = "failed", str(e)
+        with self._lock:
+            self.state = state
+            self.finished_at = time.time()
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                "id": self.id,
+                "state": self.state,
+                "done": self.done,
+                "remaining": max(self.total - self.done, 0),
+                "total": self.total,
+                "updates": list(self.updates),
+                "error": self.error,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+# Streamed pages are sent in chunks of about this size
+CHUNK_BYTES = 16 * 1024
+
+def is_db_page(path):
+    """GET pages whose content depends only on the database (cacheable by revision)."""
+    return path in ("/", "/list") or path == "/api/parcels" or path.startswith("/api/parcels/")
+
+def page_etag(path, query):
+    """
+    ETag of a database-backed page: DB revision + URL + stylesheet version.
+    The JSON API returns the scheduling columns too, so rescheduling changes its ETags.
+    """
+    key = f"{path}?{query}|{STYLE_VERSION}"
+    revision = get_data_revision(schedule=path.startswith("/api/"))
+    return f'W/"{revision}-{hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]}"'
+
+# Notified when an in-process check records status changes; /events also
+# polls the status_changes table every EVENTS_POLL_SECONDS for changes made
+# by other processes (cron)
+STATUS_CHANGED = threading.Condition()
+EVENTS_POLL_SECONDS = 5
+EVENTS_HEARTBEAT_SECONDS = 15
+
+# Background checks by job id; finished jobs are kept for polling, up to MAX_CHECK_JOBS
+CHECK_JOBS = {}
+MAX_CHECK_JOBS = 20
+_check_jobs_lock = threading.Lock()
+
+# Check-and-notify loop run inside the web app (PARCEL_WEB_DAEMON=1), see daemon.py
+CHECK_LOOP = None
+
+def wake_check_loop():
+    """Have the embedded loop check new parcels now instead of after its sleep."""
+    if CHECK_LOOP:
+        CHECK_LOOP.wake()
+
+def on_loop_check(updates, stats):
+    if updates:
+        with STATUS_CHANGED:
+            STATUS_CHANGED.notify_all()
+
+def start_check_job():
+    """Start a background check, or return the one already running."""
+    with _check_jobs_lock:
+        for job in CHECK_JOBS.values():
+            if job.state == "running":
+                return job
+        job = CheckJob()
+        CHECK_JOBS[job.id] = job
+        while len(CHECK_JOBS) > MAX_CHECK_JOBS:
+            del CHECK_JOBS[next(iter(CHECK_JOBS))]
+    threading.Thread(target=job.run, name=f"check-{job.id}", daemon=True).start()
+    return job
+
+CHECK_PROGRESS_TEMPLATE = Template('''
+    <div class="message" id="check-progress">🔄 Checking for updates (job {{ id }})...</div>
+    <script>
+    (function poll() {
+        fetch("/check/{{ id }}").then(r => r.json()).then(job => {
+            const box = document.getElementById("check-progress");
+            if (job.state === "running") {
+                box.textContent = `🔄 Checking for updates: ${job.done}/${job.total} parcel(s), ${job.updates.length} update(s) so far`;
+                setTimeout(poll, 1000);
+            } else if (job.state === "failed") {
+                box.className = "message error";
+                box.textContent = "Check failed: " + job.error;
+            } else if (job.state === "skipped") {
+                box.className = "message";
+                box.textContent = "Check skipped: " + job.error;
+            } else {
+                box.className = job.updates.length ? "message success" : "message";
+                box.innerHTML = job.updates.length
+                    ? `Found ${job.updates.length} update(s)! <a href="/list">Reload list</a>`
+                    : "No new updates";
+            }
+        });
+    })();
+    </script>
+    ''', "check_progress")
+
+def check_progress_html(job):
+    """Status message that polls /check/<job id> until the check is over."""
+    return CHECK_PROGRESS_TEMPLATE.render(id=job.id)
+
+# Parcels per page in the dashboard and (by default) in /api/parcels
+PAGE_SIZE = 50
+MAX_API_PAGE_SIZE = 500
+
+def param(params, name, default=None):
+    """First value of a query string parameter."""
+    return params.get(name, [default])[0]
+
+def handle_api(method, path, params, body):
+    """
+    JSON API, returns (status, document):
+      GET  /api/parcels?limit=&cursor=&carrier=&status=&active=1
+      POST /api/parcels  {"parcels": ["LP...", {"tracking_number": "...", "alias": "..."}]}
+      GET  /api/parcels/<n>
+      GET  /api/parcels/<n>/events
+    """
+    parts = [p for p in path.split("/") if p][2:]
+    
+    if not parts and method == "GET":
+        status = param(params, "status")
+        if status and status not in STATUS_CLASSES:
+            return 400, {"error": f"unknown status, expected one of {', '.join(STATUS_CLASSES)}"}
+        try:
+            limit = min(int(param(params, "limit", PAGE_SIZE)), MAX_API_PAGE_SIZE)
+            parcels, next_cursor = query_parcels(
+                limit=max(limit, 1), cursor=param(params, "cursor"), carrier=param(params, "carrier"),
+                state=status, include_archived=param(params, "active") != "1",
+            )
+        except ValueError:
+            return 400, {"error": "limit and cursor must be integers"}
+        return 200, {"parcels": parcels, "next_cursor": next_cursor}
+    
+    if not parts and method == "POST":
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError:
+            return 400, {"error": "invalid JSON"}
+        items = payload.get("parcels") if isinstance(payload, dict) else payload
+        if not isinstance(items, list):
+            return 400, {"error": "expected a list of parcels"}
+        items = [{"tracking_number": i} if isinstance(i, str) else i for i in items]
+        if not all(isinstance(i, dict) for i in items):
+            return 400, {"error": "parcels must be tracking numbers or objects"}
+        results = add_parcels(items)
+        wake_check_loop()
+        return 200, {"added": sum(r["added"] for r in results), "results": results}
+    
+    if len(parts) == 1 and method == "GET":
+        parcel = get_parcel(parts[0])
+        return (200, parcel) if parcel else (404, {"error": "parcel not found"})
+    
+    if len(parts) == 2 and parts[1] == "events" and method == "GET":
+        history = get_parcel_history(parts[0])
+        if not history:
+            return 404, {"error": "parcel not found"}
+        return 200, {"tracking_number": parts[0], "events": history["events"]}
+    
+    return 404, {"error": "not found"}
+
+def handle_export(params):
+    """
+    GET /api/export?format=jsonl|csv&carrier=&status=&from=&to=&after_event=
+    streams parcels with their events; the X-Export-Watermark header is the
+    after_event value for the next incremental export.
+    """
+    fmt = param(params, "format", "jsonl")
+    status = param(params, "status")
+    if status and status not in STATUS_CLASSES:
+        return 400, {"error": f"unknown status, expected one of {', '.join(STATUS_CLASSES)}"}
+    try:
+        watermark, parcels = iter_export(
+            carrier=param(params, "carrier"), state=status,
+            date_from=param(params, "from"), date_to=param(params, "to"),
+            after_event=param(params, "after_event"),
+        )
+        lines = export_lines(parcels, fmt)
+    except ValueError as e:
+        return 400, {"error": str(e)}
+    return 200, lines, {
+        "Content-type": CONTENT_TYPES[fmt],
+        "Content-Disposition": f'attachment; filename="parcels.{fmt}"',
+        "X-Export-Watermark": str(watermark),
+    }
 
 def handle_request(method, path, query_string, body):
-    """Handle HTTP requests and return HTML response."""
+    """
+    Handle HTTP requests and return an HTML page (str), a JSON document
+    (dict) or (status, JSON document).
+    """
     message = ""
     
     # Parse query string
     params = parse_qs(query_string) if query_string else {}
     
+    if path == "/api/parcels" or path.startswith("/api/parcels/"):
+        return handle_api(method, path, params, body)
+    if path == "/api/export" and method == "GET":
+        return handle_export(params)
+    
     # Parse POST body
     if method == "POST" and body:
         try:
@@ -238,74 +514,31 @@ def handle_request(method, path, query_string, body):
             alias = post_data.get("alias", [""])[0].strip()
             if tracking_number:
                 success, msg = add_parcel(tracking_number, alias if alias else None)
-                message = f"<div class='message {'success' if success else 'error'}'>{msg}</div>"
+                message = message_html(msg, success)
+                wake_check_loop()
             else:
-                message = "<div class='message error'>Please enter a tracking number</div>"
+                message = message_html("Please enter a tracking number")
         return handle_list(params, message)
     elif path.startswith("/remove/"):
         tracking_number = path.replace("/remove/", "")
         if tracking_number:
             success, msg = remove_parcel(tracking_number)
-            message = f"<div class='message {'success' if success else 'error'}'>{msg}</div>"
+            message = message_html(msg, success)
         return handle_list(params, message)
     elif path == "/check":
-        updates = check_updates()
-        if updates:
-            message = f"<div class='message success'>Found {len(updates)} update(s)!</div>"
-        else:
-            message = "<div class='message'>No new updates</div>"
-        return handle_list(params, message)
+        job = start_check_job()
+        return handle_list(params, check_progress_html(job))
+    elif path.startswith("/check/"):
+        job = CHECK_JOBS.get(path.replace("/check/", ""))
+        return job.snapshot() if job else {"error": "unknown job"}
     elif path.startswith("/track/"):
         tracking_number = path.replace("/track/", "")
-        return handle_track(tracking_number)
+        return handle_track(tracking_number, refresh="refresh" in params)
     else:
         return handle_list(params, "")
 
-def handle_list(params, message):
-    """Display list of parcels."""
-    parcels = list_parcels()
-    
-    # Build parcel list HTML
-    if parcels:
-        parcel_html = '<ul class="parcel-list">'
-        for p in parcels:
-            carrier = get_carrier_display_name(p["carrier"]) if p["carrier"] else "Unknown"
-            alias_display = p["alias"] if p["alias"] else "Untitled"
-            status_class = get_status_class(p["status"])
-            status_display = p["status"] if p["status"] else "Pending"
-            last_update = p["last_update"] if p["last_update"] else "Never"
-            
-            parcel_html += f'''
-            <li class="parcel-item">
-                <div class="parcel-info">
-                    <div class="parcel-alias">{alias_display}</div>
-                    <div class="parcel-number">{p["tracking_number"]}</div>
-                    <span class="parcel-carrier">{carrier}</span>
-                </div>
-                <div>
-                    <span class="parcel-status {status_class}">{status_display}</span>
-                </div>
-                <div class="parcel-actions">
-                    <button onclick="location.href='/track/{p["tracking_number"]}'" class="secondary">Details</button>
-                    <button onclick="if(confirm('Remove this parcel?')) location.href='/remove/{p["tracking_number"]}'" class="danger">Remove</button>
-                </div>
-            </li>
-            '''
-        parcel_html += '</ul>'
-    else:
-        parcel_html = '''
-        <div class="empty-state">
-            <svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                <rect x="2" y="7" width="20" height="14" rx="2" ry="2"></rect>
-                <path d="M16 21V5a2 2 0 0 0-2-2h-4a2 2 0 0 0-2 2v16"></path>
-            </svg>
-            <p>No parcels being tracked yet.</p>
-            <p style="font-size: 0.9em; margin-top: 10px;">Add your first parcel below!</p>
-        </div>
-        '''
-    
-    content = f'''
-    {message}
+LIST_TEMPLATE = Template(LAYOUT_HEAD + '''
+    {{ message|raw }}
     <div class="card">
         <h2>Add New Parcel</h2>
         <form method="POST" action="/add">
@@ -327,88 +560,368 @@ def handle_list(params, message):
     </div>
     
     <div class="card">
-        <h2>Tracked Parcels <span class="badge">{len(parcels)}</span></h2>
-        {parcel_html}
+        <h2>Tracked Parcels <span class="badge">{{ total }}</span></h2>
+        {% if total %}<ul class="parcel-list">{% for p in page %}
+            <li class="parcel-item" data-tn="{{ p.tracking_number }}">
+                <div class="parcel-info">
+                    <div class="parcel-alias">{{ p.alias }}</div>
+                    <div class="parcel-number">{{ p.tracking_number }}</div>
+                    <span class="parcel-carrier">{{ p.carrier }}</span>
+                </div>
+                <div>
+                    <span class="parcel-status {{ p.status_class|raw }}">{{ p.status }}</span>
+                </div>
+                <div class="parcel-actions">
+                    <button onclick="location.href='/track/{{ p.tracking_number|url }}'" class="secondary">Details</button>
+                    <button onclick="if(confirm('Remove this parcel?')) location.href='/remove/{{ p.tracking_number|url }}'" class="danger">Remove</button>
+                </div>
+            </li>{% endfor %}
+        </ul>
+        {% if page.paged %}<div class="actions-bar" style="margin-top: 15px;">
+            {% if page.cursor %}<button onclick="location.href='/list'">⏮ First page</button>{% endif %}
+            {% if page.next_cursor %}<button onclick="location.href='/list?cursor={{ page.next_cursor|url }}'">Next page →</button>
+            <button onclick="location.href='/list?all=1'" class="secondary">Show all</button>{% endif %}
+        </div>{% endif %}
+        {% else %}
+        <div class="empty-state">
+            <svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+                <rect x="2" y="7" width="20" height="14" rx="2" ry="2"></rect>
+                <path d="M16 21V5a2 2 0 0 0-2-2h-4a2 2 0 0 0-2 2v16"></path>
+            </svg>
+            <p>No parcels being tracked yet.</p>
+            <p style="font-size: 0.9em; margin-top: 10px;">Add your first parcel below!</p>
+        </div>
+        {% endif %}
     </div>
-    '''
-    
-    return generate_html("Dashboard", content)
+    <script>
+    // Live status updates: patch the affected rows instead of reloading
+    if (window.EventSource) {
+        const stream = new EventSource("/events");
+        stream.addEventListener("status", e => {
+            const change = JSON.parse(e.data);
+            const row = document.querySelector(`li[data-tn="${CSS.escape(change.tracking_number)}"]`);
+            if (!row) return;
+            const badge = row.querySelector(".parcel-status");
+            badge.className = "parcel-status " + change.status_class;
+            badge.textContent = change.status || "Pending";
+        });
+    }
+    </script>
+''' + LAYOUT_FOOT, "list")
 
-def handle_track(tracking_number):
-    """Display detailed tracking information for a parcel."""
-    result = track_parcel(tracking_number)
-    
-    if not result:
-        content = f'''
-        <div class="card">
-            <h2>Tracking Details</h2>
-            <div class="message error">Could not track parcel: {tracking_number}</div>
-            <button onclick="location.href='/list'">← Back to List</button>
-        </div>
-        '''
-        return generate_html("Tracking Details", content)
-    
-    carrier = get_carrier_display_name(result.get("carrier", "Unknown"))
-    status = result.get("status", "Unknown")
-    events = result.get("events", [])
-    
-    events_html = ""
-    if events:
-        events_html = '<ul class="event-list">'
-        for event in events:
-            date = event.get("date", "N/A")
-            desc = event.get("description", event.get("status", "No description"))
-            location = event.get("location", "")
-            location_str = f'<div class="event-location">📍 {location}</div>' if location else ""
-            events_html += f'''
-            <li class="event-item">
-                <div class="event-date">{date}</div>
-                <div class="event-desc">{desc}</div>
-                {location_str}
-            </li>
-            '''
-        events_html += '</ul>'
-    else:
-        events_html = '<p style="color: #718096; padding: 20px;">No tracking events available.</p>'
-    
-    content = f'''
+TRACK_TEMPLATE = Template(LAYOUT_HEAD + '''
     <div class="card">
         <h2>📦 Tracking Details</h2>
-        <p style="margin-bottom: 20px;">
-            <strong>Tracking Number:</strong> <code>{tracking_number}</code><br>
-            <strong>Carrier:</strong> {carrier}<br>
-            <strong>Status:</strong> <span class="parcel-status {get_status_class(status)}">{status}</span>
+        {% if found %}<p style="margin-bottom: 20px;">
+            <strong>Tracking Number:</strong> <code>{{ tracking_number }}</code><br>
+            <strong>Carrier:</strong> {{ carrier }}<br>
+            <strong>Status:</strong> <span class="parcel-status {{ status_class|raw }}">{{ status }}</span>
         </p>
         
         <h3 style="margin-top: 30px; margin-bottom: 15px;">📜 Event History</h3>
-        {events_html}
+        {% if has_events %}<ul class="event-list">{% for e in events %}
+            <li class="event-item">
+                <div class="event-date">{{ e.date }}</div>
+                <div class="event-desc">{{ e.description }}</div>
+                {% if e.location %}<div class="event-location">📍 {{ e.location }}</div>{% endif %}
+            </li>{% endfor %}
+        </ul>{% else %}<p style="color: #718096; padding: 20px;">No tracking events available.</p>{% endif %}
         
         <div style="margin-top: 30px;">
             <button onclick="location.href='/list'">← Back to List</button>
+            <button onclick="location.href='/track/{{ tracking_number|url }}?refresh=1'">🔄 Refresh from carrier</button>
         </div>
+        {% else %}<div class="message error">Could not track parcel: {{ tracking_number }}</div>
+        <button onclick="location.href='/list'">← Back to List</button>
+        {% endif %}
     </div>
-    '''
+''' + LAYOUT_FOOT, "track")
+
+def parcel_rows(parcels):
+    """
+    Display values of dashboard rows (raw values; the template escapes them).
+    Carrier names and status classes are looked up once per distinct value:
+    most parcels of a page share a few carriers and statuses.
+    """
+    carriers, classes = {}, {}
+    for p in parcels:
+        carrier, status = p["carrier"], p["status"]
+        if carrier not in carriers:
+            carriers[carrier] = get_carrier_display_name(carrier) if carrier else "Unknown"
+        if status not in classes:
+            classes[status] = get_status_class(status)
+        yield {
+            "tracking_number": p["tracking_number"],
+            "alias": p["alias"] or "Untitled",
+            "carrier": carriers[carrier],
+            "status": status or "Pending",
+            "status_class": classes[status],
+        }
+
+class ParcelPage:
+    """
+    Rows of one dashboard page, read lazily from a parcel iterable. With a
+    limit, the iterable may hold one extra parcel: its presence sets
+    next_cursor, known once the rows are rendered (the pager comes after).
+    """
     
-    return generate_html(f"Track {tracking_number}", content)
+    def __init__(self, parcels, cursor=None, limit=None, next_cursor=None):
+        self.parcels = parcels
+        self.cursor = cursor
+        self.limit = limit
+        self.next_cursor = next_cursor
+    
+    @property
+    def paged(self):
+        return bool(self.cursor or self.next_cursor)
+    
+    def _limited(self):
+        try:
+            for i, p in enumerate(self.parcels):
+                if i == self.limit:
+                    self.next_cursor = str(last["id"])
+                    break
+                last = p
+                yield p
+        finally:
+            close = getattr(self.parcels, "close", None)
+            if close:
+                close()  # hands the pooled connection back
+    
+    def __iter__(self):
+        return parcel_rows(self._limited())
 
-# HTTP Server
-from http.server import HTTPServer, BaseHTTPRequestHandler
+def handle_list(params, message):
+    """
+    Stream one page of parcels, newest first (?cursor= for the next ones,
+    ?all=1 for all of them), rendered as they are read from the database.
+    """
+    cursor = param(params, "cursor")
+    limit = None if param(params, "all") else PAGE_SIZE
+    try:
+        parcels = iter_parcels(limit=limit and limit + 1, cursor=cursor)
+    except ValueError:
+        cursor = None
+        parcels = iter_parcels(limit=limit and limit + 1)
+    return LIST_TEMPLATE.stream(
+        title="Dashboard", style_url=STYLE_URL, message=message, total=count_parcels(),
+        page=ParcelPage(parcels, cursor, limit),
+    )
+
+def event_rows(events):
+    for event in events:
+        yield {
+            "date": event.get("date", "N/A"),
+            "description": event.get("description", event.get("status", "No description")),
+            "location": event.get("location", ""),
+        }
+
+def handle_track(tracking_number, refresh=False):
+    """
+    Stream detailed tracking information for a parcel. Tracked parcels are
+    rendered from the stored event history, read as the page is sent;
+    untracked ones, parcels without history yet and refresh=1 ask the
+    carrier (cached unless refresh).
+    """
+    result = None if refresh else get_parcel_history(tracking_number, stream=True)
+    if not result or not result["event_count"]:
+        if result:
+            result["events"].close()
+        result = track_parcel(tracking_number, use_cache=not refresh)
+        if result:
+            store_tracking_result(tracking_number, result)
+    
+    if not result:
+        return TRACK_TEMPLATE.stream(title="Tracking Details", style_url=STYLE_URL,
+                                     found=False, tracking_number=tracking_number)
+    
+    status = result.get("status", "Unknown")
+    events = result.get("events", [])
+    return TRACK_TEMPLATE.stream(
+        title=f"Track {tracking_number}", style_url=STYLE_URL, found=True,
+        tracking_number=tracking_number,
+        carrier=get_carrier_display_name(result.get("carrier") or "Unknown"),
+        status=status, status_class=get_status_class(status),
+        has_events=result.get("event_count") or bool(events), events=event_rows(events),
+    )
+
+# HTTP Server (one thread per request, so a slow page never blocks the others)
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 class ParcelHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 for chunked page streaming (and keep-alive); idle
+    # keep-alive connections are dropped after `timeout` seconds
+    protocol_version = "HTTP/1.1"
+    timeout = 120
+    
     def log_message(self, format, *args):
         # Suppress default logging
         pass
     
+    def not_modified(self, etag):
+        """True (after answering 304) if the client already has this version."""
+        if etag not in (self.headers.get("If-None-Match") or ""):
+            return False
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return True
+    
+    def send_body(self, status, content_type, data, etag=None, cache_control="no-cache", headers=None):
+        """Send a response, gzipped when the client accepts it and it is worth it."""
+        if len(data) >= GZIP_MIN_BYTES and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            data = gzip.compress(data, GZIP_LEVEL)
+            encoding = "gzip"
+        else:
+            encoding = None
+        self.send_response(status)
+        self.send_header("Content-type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", cache_control)
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if etag:
+            self.send_header("ETag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def send_chunked(self, status, content_type, pieces, etag=None, headers=None):
+        """
+        Stream a page generated piece by piece with chunked transfer
+        encoding, gzipped on the fly when the client accepts it. Pieces are
+        sent in chunks of about CHUNK_BYTES (the first one right away), so
+        memory stays bounded whatever the page size.
+        """
+        if self.request_version == "HTTP/1.0":
+            self.send_body(status, content_type, "".join(pieces).encode("utf-8"), etag, headers=headers)
+            return
+        compressor = None
+        if "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+        self.send_response(status)
+        self.send_header("Content-type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if compressor:
+            self.send_header("Content-Encoding", "gzip")
+        if etag:
+            self.send_header("ETag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        
+        def write_chunk(data, last=False):
+            if compressor:
+                data = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+            if data:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        
+        buffer, size, sent = [], 0, False
+        try:
+            for piece in pieces:
+                buffer.append(piece)
+                size += len(piece)
+                if size >= CHUNK_BYTES or not sent:
+                    write_chunk("".join(buffer).encode("utf-8"))
+                    buffer, size, sent = [], 0, True
+            write_chunk("".join(buffer).encode("utf-8"), last=True)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except Exception as e:
+            # Headers are gone: end the connection without the final chunk so
+            # the client sees a truncated response rather than a complete page
+            print(f"Error while streaming {self.path}: {e!r}", file=sys.stderr)
+            self.close_connection = True
+        finally:
+            pieces.close()
+    
+    def respond(self, page, etag=None):
+        """
+        Send an HTML page (a str, or a generator of pieces streamed with
+        chunked encoding), or a dict (optionally as (status, dict)) as
+        compact JSON. (status, generator, headers) streams another content
+        type given by headers["Content-type"].
+        """
+        status, headers = 200, {}
+        if isinstance(page, tuple):
+            status, page, *extra = page
+            headers = dict(extra[0]) if extra else {}
+        if isinstance(page, types.GeneratorType):
+            content_type = headers.pop("Content-type", "text/html; charset=utf-8")
+            self.send_chunked(status, content_type, page, etag if status == 200 else None, headers)
+            return
+        if isinstance(page, dict):
+            data = json.dumps(page, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        else:
+            data = page.encode("utf-8")
+            content_type = "text/html; charset=utf-8"
+        self.send_body(status, content_type, data, etag if status == 200 else None)
+    
     def do_GET(self):
         path = self.path.split("?")[0]
         query = self.path.split("?")[1] if "?" in self.path else ""
         
-        html = handle_request("GET", path, query, None)
+        if path == "/events":
+            self.stream_events(parse_qs(query))
+            return
+        if path == STYLE_PATH:
+            if not self.not_modified(STYLE_ETAG):
+                self.send_body(200, "text/css; charset=utf-8", STYLE_CSS.encode("utf-8"), STYLE_ETAG,
+                               "public, max-age=31536000, immutable")
+            return
+        
+        # Pages built only from the database are revalidated against its revision
+        etag = page_etag(path, query) if is_db_page(path) else None
+        if etag and self.not_modified(etag):
+            return
+        self.respond(handle_request("GET", path, query, None), etag)
+    
+    def stream_events(self, params):
+        """
+        Server-Sent Events: one `status` event per row of status_changes,
+        with the row id as event id. Reconnecting browsers send
+        Last-Event-ID and get what they missed; new clients start now.
+        """
+        last_id = self.headers.get("Last-Event-ID") or param(params, "last_id")
+        try:
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            last_id = latest_status_change_id()
         
         self.send_response(200)
-        self.send_header("Content-type", "text/html; charset=utf-8")
+        self.send_header("Content-type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")  # the stream ends with the connection
         self.end_headers()
-        self.wfile.write(html.encode("utf-8"))
+        self.close_connection = True
+        
+        last_write = time.monotonic()
+        try:
+            self.wfile.write(b"retry: 5000\n\n")
+            self.wfile.flush()
+            while True:
+                changes = status_changes_since(last_id)
+                for change in changes:
+                    change["status_class"] = get_status_class(change["status"])
+                    data = json.dumps(change, ensure_ascii=False, separators=(",", ":"))
+                    self.wfile.write(f"id: {change['id']}\nevent: status\ndata: {data}\n\n".encode("utf-8"))
+                    last_id = change["id"]
+                if not changes and time.monotonic() - last_write >= EVENTS_HEARTBEAT_SECONDS:
+                    self.wfile.write(b": ping\n\n")
+                elif not changes:
+                    with STATUS_CHANGED:
+                        STATUS_CHANGED.wait(EVENTS_POLL_SECONDS)
+                    continue
+                self.wfile.flush()
+                last_write = time.monotonic()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
     
     def do_POST(self):
         path = self.path.split("?")[0]
@@ -417,24 +930,44 @@ class ParcelHandler(BaseHTTPRequestHandler):
         content_length = int(self.headers.get("Content-Length", 0))
         body = self.rfile.read(content_length) if content_length > 0 else None
         
-        html = handle_request("POST", path, query, body)
-        
-        self.send_response(200)
-        self.send_header("Content-type", "text/html; charset=utf-8")
-        self.end_headers()
-        self.wfile.write(html.encode("utf-8"))
+        self.respond(handle_request("POST", path, query, body))
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
 
 def main():
     """Start the web server."""
+    global CHECK_LOOP
     init_db()
     
     port = int(os.environ.get("PORT", 8080))
     host = os.environ.get("HOST", "0.0.0.0")
     
-    server = HTTPServer((host, port), ParcelHandler)
+    lock = None
+    if os.environ.get("PARCEL_WEB_DAEMON") == "1":
+        try:
+            get_routing()
+        except (OSError, ValueError) as e:
+            print(f"Not starting: invalid notification config: {e}", file=sys.stderr)
+            return 1
+        lock = RunLock()
+        try:
+            lock.acquire()
+            CHECK_LOOP = CheckLoop(on_check=on_loop_check)
+            CHECK_LOOP.start()
+            signal.signal(signal.SIGHUP, lambda signum, frame: CHECK_LOOP.reload())
+        except LockHeld as e:
+            print(f"Not running the check loop: {e}", file=sys.stderr)
+            lock = None
+    signal.signal(signal.SIGTERM, _terminate)
+    
+    server = ThreadingHTTPServer((host, port), ParcelHandler)
+    server.daemon_threads = True
     print(f"🚀 Parcel Tracker Web Interface")
     print(f"📍 http://localhost:{port}")
     print(f"📍 http://{host}:{port}")
+    if CHECK_LOOP:
+        print(f"🔁 Checking parcels and sending notifications in the background")
     print(f"\nPress Ctrl+C to stop")
     
     try:
@@ -442,6 +975,12 @@ def main():
     except KeyboardInterrupt:
         print("\n\n👋 Shutting down...")
         server.shutdown()
+    finally:
+        if CHECK_LOOP:
+            CHECK_LOOP.stop()
+            CHECK_LOOP.join(30)
+        if lock:
+            lock.release()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
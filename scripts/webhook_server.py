@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Stand-in notification receiver for testing parcel-tracker sinks.
+Accepts the webhook sink's POSTs ({"updates": [...]}) on keep-alive
+HTTP/1.1 connections, and optionally the socket sink's JSON Lines on a
+Unix socket, and reports how many updates arrive per second. It can
+fail a share of requests or answer slowly, to exercise the outbox retries.
+
+Usage:
+  webhook_server.py [--port 8099] [--host 127.0.0.1] [--unix PATH]
+                    [--fail-rate 0.1] [--delay MS] [--output FILE] [--report SECONDS]
+
+Then point a sink at it in notify.json:
+  {"sinks": {"hook": {"type": "webhook", "url": "http://127.0.0.1:8099/updates"}}}
+Uses only standard library (no external dependencies).
+"""
+
+import argparse
+import json
+import os
+import random
+import socketserver
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class Receiver:
+    """Counts (and optionally records) received updates; thread-safe."""
+
+    def __init__(self, output=None):
+        self.output = open(output, "a", encoding="utf-8") if output else None
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.batches = 0
+        self.failed = 0
+
+    def receive(self, updates):
+        with self.lock:
+            self.updates += len(updates)
+            self.batches += 1
+            if self.output:
+                for u in updates:
+                    self.output.write(json.dumps(u, ensure_ascii=False) + "\n")
+                self.output.flush()
+
+    def count_failure(self):
+        with self.lock:
+            self.failed += 1
+
+    def snapshot(self):
+        with self.lock:
+            return self.updates, self.batches, self.failed
+
+
+def make_handler(receiver, fail_rate, delay):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes: without this, Nagle + delayed ACK stall each reply ~40ms
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if delay:
+                time.sleep(delay)
+            if fail_rate and random.random() < fail_rate:
+                receiver.count_failure()
+                self.reply(503, {"error": "simulated failure"})
+                return
+            try:
+                updates = json.loads(body)["updates"]
+            except (ValueError, KeyError, TypeError):
+                self.reply(400, {"error": "expected {\"updates\": [...]}"})
+                return
+            receiver.receive(updates)
+            self.reply(200, {"received": len(updates)})
+
+    return WebhookHandler
+
+
+def make_socket_handler(receiver):
+    class SocketHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            updates = [json.loads(line) for line in self.rfile if line.strip()]
+            if updates:
+                receiver.receive(updates)
+
+    return SocketHandler
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in webhook / socket receiver for notification sinks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--unix", metavar="PATH", help="also accept JSON Lines on this Unix socket")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="share of webhook requests answered 503 (default: %(default)s)")
+    parser.add_argument("--delay", type=float, default=0.0, metavar="MS",
+                        help="milliseconds to wait before answering")
+    parser.add_argument("--output", metavar="FILE", help="append received updates to FILE as JSON Lines")
+    parser.add_argument("--report", type=float, default=5.0, metavar="SECONDS",
+                        help="print throughput every SECONDS (default: %(default)s)")
+    args = parser.parse_args()
+
+    receiver = Receiver(args.output)
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 make_handler(receiver, args.fail_rate, args.delay / 1000))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Webhook receiver on http://{args.host}:{args.port}/", flush=True)
+
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.unlink(args.unix)
+        unix_server = ThreadingUnixServer(args.unix, make_socket_handler(receiver))
+        threading.Thread(target=unix_server.serve_forever, daemon=True).start()
+        print(f"Socket receiver on {args.unix}", flush=True)
+
+    last_updates, last_time = 0, time.monotonic()
+    try:
+        while True:
+            time.sleep(args.report)
+            updates, batches, failed = receiver.snapshot()
+            now = time.monotonic()
+            rate = (updates - last_updates) / (now - last_time)
+            print(f"{updates} update(s) in {batches} batch(es), {failed} failed; {rate:,.0f} updates/sec",
+                  flush=True)
+            last_updates, last_time = updates, now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+"""
+Shared test setup: points HOME at a temporary directory (the database and
+notify.json live under it) and puts scripts/ on sys.path. Import it before
+any module from scripts/.
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+HOME = tempfile.mkdtemp(prefix="parcel-tracker-tests-")
+atexit.register(shutil.rmtree, HOME, ignore_errors=True)
+os.environ["HOME"] = HOME
+os.environ.pop("PARCEL_NOTIFY_CONFIG", None)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
@@ -0,0 +1,63 @@
+import unittest
+
+import support  # noqa: F401  (sets HOME before the scripts are imported)
+from carrier_detection import detect_carrier, detect_carriers, verified_carrier
+
+
+class RankingTest(unittest.TestCase):
+    def test_s10_ranks_origin_carrier_first(self):
+        self.assertEqual(detect_carriers("RR123456785FR"), ["colissimo", "usps"])
+        self.assertEqual(detect_carriers("CJ123456785GB"), ["royalmail", "colissimo", "usps"])
+        self.assertEqual(verified_carrier("RR123456785US"), "usps")
+
+    def test_s10_bad_check_digit_is_ruled_out(self):
+        self.assertEqual(detect_carriers("RR123456784FR"), ["colissimo"])
+        self.assertIsNone(verified_carrier("RR123456784FR"))
+
+    def test_ups_1z(self):
+        self.assertEqual(detect_carriers("1Z999AA10123456784"), ["ups"])
+        self.assertEqual(verified_carrier("1Z999AA10123456784"), "ups")
+        self.assertEqual(detect_carriers("1Z999AA10123456785"), [])
+
+    def test_usps_impb(self):
+        self.assertEqual(detect_carriers("9400111899223197428497"), ["usps", "dhl"])
+        self.assertEqual(verified_carrier("9400111899223197428497"), "usps")
+        self.assertEqual(detect_carriers("9400111899223197428490"), ["dhl"])
+
+    def test_fedex12_valid_ranks_above_pattern_matches(self):
+        # Only the two best-ranked carrier APIs are tried, so FedEx must lead
+        self.assertEqual(detect_carriers("797843158299"), ["fedex", "gls", "ups", "yanwen", "4px", "colissimo"])
+        self.assertEqual(detect_carrier("797843158299"), "fedex")
+        # A weak check never confirms a carrier
+        self.assertIsNone(verified_carrier("797843158299"))
+
+    def test_fedex12_invalid_is_ruled_out(self):
+        self.assertEqual(detect_carriers("797843158290"), ["gls", "ups", "yanwen", "4px", "colissimo"])
+
+    def test_fedex15_mod10(self):
+        self.assertEqual(detect_carriers("123456789012343"), ["fedex", "4px", "colissimo"])
+        self.assertEqual(detect_carriers("123456789012344"), ["4px", "colissimo"])
+
+
+class ChainPlanTest(unittest.TestCase):
+    def test_valid_fedex12_skips_digit_run_carriers(self):
+        from parcel_tracker import _chain_plan
+        # FedEx has no free API: straight to the universal trackers, not GLS / Yanwen
+        primary, fallbacks = _chain_plan("797843158299", detect_carrier("797843158299"))
+        self.assertEqual(primary, [])
+        self.assertEqual(fallbacks[0], "tracktry")
+
+    def test_invalid_fedex12_tries_pattern_matches(self):
+        from parcel_tracker import _chain_plan
+        primary, _ = _chain_plan("797843158290", detect_carrier("797843158290"))
+        self.assertEqual(primary, ["gls", "yanwen"])
+
+    def test_s10_tries_origin_carrier_only(self):
+        from parcel_tracker import _chain_plan
+        primary, fallbacks = _chain_plan("RR123456785FR", detect_carrier("RR123456785FR"))
+        self.assertEqual(primary, ["colissimo"])
+        self.assertNotIn("cainiao", fallbacks)
+
+
+if __name__ == "__main__":
+    unittest.main()
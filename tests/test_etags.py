@@ -0,0 +1,42 @@
+import unittest
+
+import support  # noqa: F401  (sets HOME before the scripts are imported)
+from db import DB_PATH, transaction
+from parcel_tracker import add_parcel, init_db
+from web_app import page_etag
+
+
+class PageEtagTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        init_db()
+        add_parcel("LP00123456789CN", "Etag test")
+
+    def reschedule(self, next_check_at):
+        with transaction(DB_PATH) as conn:
+            conn.execute("UPDATE parcels SET next_check_at = ? WHERE tracking_number = ?",
+                         (next_check_at, "LP00123456789CN"))
+
+    def test_reschedule_changes_api_etags(self):
+        self.reschedule("2026-10-01 10:00:00")
+        before = page_etag("/api/parcels", ""), page_etag("/api/parcels/LP00123456789CN", "")
+        self.reschedule("2026-10-02 10:00:00")
+        after = page_etag("/api/parcels", ""), page_etag("/api/parcels/LP00123456789CN", "")
+        self.assertNotEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+
+    def test_reschedule_keeps_page_etag(self):
+        self.reschedule("2026-10-03 10:00:00")
+        before = page_etag("/list", "")
+        self.reschedule("2026-10-04 10:00:00")
+        self.assertEqual(before, page_etag("/list", ""))
+
+    def test_same_schedule_keeps_api_etag(self):
+        self.reschedule("2026-10-05 10:00:00")
+        before = page_etag("/api/parcels", "")
+        self.reschedule("2026-10-05 10:00:00")
+        self.assertEqual(before, page_etag("/api/parcels", ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
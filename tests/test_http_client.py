@@ -0,0 +1,85 @@
+import http.client
+import socket
+import threading
+import unittest
+
+import support  # noqa: F401  (puts scripts/ on sys.path)
+from http_client import HTTPPool
+
+OK = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: keep-alive\r\n\r\nok"
+
+
+class DroppingServer:
+    """
+    Answers the first request of each connection and keeps it alive, then
+    reads the next request and closes without answering (a server that
+    acted on a request before dropping the connection). Counts requests.
+    """
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(8)
+        self.port = self.sock.getsockname()[1]
+        self.requests = 0
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def read_request(self, f):
+        line = f.readline()
+        if not line:
+            return False
+        length = 0
+        while True:
+            header = f.readline()
+            if header in (b"\r\n", b""):
+                break
+            name, _, value = header.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+        f.read(length)
+        self.requests += 1
+        return True
+
+    def handle(self, conn):
+        with conn, conn.makefile("rb") as f:
+            if not self.read_request(f):
+                return
+            conn.sendall(OK)
+            self.read_request(f)
+
+    def close(self):
+        self.sock.close()
+
+
+class StaleConnectionRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.server = DroppingServer()
+        self.url = f"http://127.0.0.1:{self.server.port}/"
+        self.pool = HTTPPool()
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.close()
+
+    def test_get_is_resent_on_a_fresh_connection(self):
+        self.assertEqual(self.pool.request("GET", self.url)[0], 200)
+        self.assertEqual(self.pool.request("GET", self.url)[0], 200)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_post_is_not_resent_once_sent(self):
+        self.assertEqual(self.pool.request("POST", self.url, body=b"{}")[0], 200)
+        with self.assertRaises(http.client.RemoteDisconnected):
+            self.pool.request("POST", self.url, body=b"{}")
+        self.assertEqual(self.server.requests, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()